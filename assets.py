@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import posixpath
+import re
+import sys
+import threading
+
+from flask import abort, request, send_file
+
+from atomic_file import write_atomic
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, тогда отдаём только gzip
+    brotli = None
+
+# Исходники лежат в static/, собранные файлы с хэшем в имени — в static/dist/
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = os.path.join(STATIC_DIR, "dist")
+if getattr(sys, "frozen", False):
+    # Сборка PyInstaller: исходники распакованы во временный каталог,
+    # а dist кладём рядом с exe, чтобы не сжимать ресурсы при каждом запуске
+    STATIC_DIR = os.path.join(sys._MEIPASS, "static")
+    DIST_DIR = os.path.join(os.path.dirname(sys.executable), "static", "dist")
+MANIFEST_PATH = os.path.join(DIST_DIR, "manifest.json")
+URL_PREFIX = "/assets/"
+# Если собрать не удалось (например, каталог dist недоступен для записи),
+# страница ссылается на исходные файлы, их отдаёт сам Flask
+FALLBACK_URL_PREFIX = "/static/"
+
+# Точки входа; шрифты, на которые ссылаются CSS, подхватываются сами
+ASSET_SOURCES = [
+    "img/favicon.png",
+    "vendor/roboto/roboto.css",
+    "vendor/fontawesome/css/fontawesome.min.css",
+    "vendor/fontawesome/css/solid.min.css",
+    "vendor/fontawesome/webfonts/fa-solid-900.woff2",
+    "vendor/jquery/jquery.min.js",
+    "css/dashboard.css",
+    "js/theme.js",
+    "js/dashboard.js",
+]
+
+# Уже сжатые форматы (woff2, png) повторно не сжимаем
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".ttf", ".svg", ".json"}
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+CSS_URL_RE = re.compile(r"url\(\s*(['\"]?)([^'\")]+)\1\s*\)")
+
+# логический путь -> путь в dist, например css/dashboard.css -> css/dashboard.1a2b3c4d5e6f.css
+manifest = {}
+_build_lock = threading.Lock()
+_build_failed = False
+
+
+def fingerprint_name(path, data):
+    root, ext = posixpath.splitext(path)
+    return f"{root}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+
+def rewrite_css_urls(path, css, built):
+    """Подменяет относительные url() в CSS на собранные файлы."""
+    base = posixpath.dirname(path)
+
+    def replace(match):
+        target = match.group(2)
+        if target.startswith(("data:", "http:", "https:", "/", "#")):
+            return match.group(0)
+        target_path = posixpath.normpath(posixpath.join(base, target.split("?")[0]))
+        return f"url({URL_PREFIX}{build_asset(target_path, built)})"
+
+    return CSS_URL_RE.sub(replace, css)
+
+
+def write_variants(dist_path, data):
+    """Пишет файл и его заранее сжатые варианты, если их ещё нет."""
+    target = os.path.join(DIST_DIR, *dist_path.split("/"))
+    if os.path.exists(target):
+        return
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+
+    if posixpath.splitext(dist_path)[1] in COMPRESSIBLE_EXTENSIONS:
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            write_atomic(target + ".gz", compressed)
+        if brotli is not None:
+            compressed = brotli.compress(data, quality=11)
+            if len(compressed) < len(data):
+                write_atomic(target + ".br", compressed)
+
+    # Основной файл пишем последним: его наличие означает готовую сборку
+    write_atomic(target, data)
+
+
+def build_asset(path, built):
+    if path in built:
+        return built[path]
+
+    with open(os.path.join(STATIC_DIR, *path.split("/")), "rb") as f:
+        data = f.read()
+    if path.endswith(".css"):
+        data = rewrite_css_urls(path, data.decode("utf-8"), built).encode("utf-8")
+
+    dist_path = fingerprint_name(path, data)
+    write_variants(dist_path, data)
+    built[path] = dist_path
+    return dist_path
+
+
+def prune(built):
+    """Удаляет из dist файлы прежних сборок."""
+    keep = {os.path.join(DIST_DIR, *p.split("/")) for p in built.values()}
+    keep |= {p + suffix for p in keep for suffix in (".gz", ".br")}
+    keep.add(MANIFEST_PATH)
+    for root, _, files in os.walk(DIST_DIR):
+        for name in files:
+            path = os.path.join(root, name)
+            if path not in keep:
+                os.remove(path)
+
+
+def build():
+    """Собирает все ресурсы и обновляет манифест."""
+    built = {}
+    for path in ASSET_SOURCES:
+        build_asset(path, built)
+
+    write_atomic(MANIFEST_PATH, json.dumps(built, indent=2).encode("utf-8"))
+    prune(built)
+    manifest.clear()
+    manifest.update(built)
+    logging.info(f"Статические ресурсы собраны: {len(built)} файлов.")
+
+
+def ensure_built():
+    """Собирает ресурсы один раз; False, если сборка не удалась."""
+    global _build_failed
+    if manifest or _build_failed:
+        return bool(manifest)
+    with _build_lock:
+        if not manifest and not _build_failed:
+            try:
+                build()
+            except Exception as e:
+                _build_failed = True
+                logging.error(
+                    f"Ошибка сборки статических ресурсов: {e}. "
+                    "Страница ссылается на исходные файлы."
+                )
+    return bool(manifest)
+
+
+def asset_url(path):
+    """URL собранного ресурса для шаблона."""
+    if not ensure_built():
+        return FALLBACK_URL_PREFIX + path
+    return URL_PREFIX + manifest[path]
+
+
+def serve_asset(filename):
+    """Отдаёт собранный ресурс, выбирая заранее сжатый вариант по Accept-Encoding."""
+    if not ensure_built():
+        abort(404)
+    path = os.path.normpath(os.path.join(DIST_DIR, filename))
+    if not path.startswith(DIST_DIR + os.sep) or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    accepted = request.accept_encodings
+    encoding = None
+    for candidate, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if accepted[candidate] and os.path.isfile(path + suffix):
+            encoding, path = candidate, path + suffix
+            break
+
+    response = send_file(path, mimetype=mimetype, conditional=True, etag=True)
+    if encoding:
+        response.headers["Content-Encoding"] = encoding
+    response.headers["Cache-Control"] = CACHE_CONTROL
+    response.headers["Vary"] = "Accept-Encoding"
+    return response
+
+
+def init_app(app):
+    app.jinja_env.globals["asset_url"] = asset_url
+    app.add_url_rule(URL_PREFIX + "<path:filename>", "assets", serve_asset)
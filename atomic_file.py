@@ -0,0 +1,57 @@
+import hashlib
+import json
+import os
+import stat
+import tempfile
+
+# mkstemp создаёт файл с правами 0600; новые файлы получают права как при
+# обычном open(), для этого umask читается один раз при импорте
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def dump_compact(obj):
+    """Сериализует объект в компактный JSON (UTF-8, без отступов)."""
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def content_hash(data):
+    return hashlib.sha1(data).hexdigest()
+
+
+def file_hash(path):
+    """Хэш текущего содержимого файла или None, если файла нет."""
+    try:
+        with open(path, "rb") as f:
+            return content_hash(f.read())
+    except OSError:
+        return None
+
+
+def write_atomic(path, data):
+    """Пишет байты во временный файл рядом и атомарно подменяет им path.
+
+    Читатель всегда видит либо старую, либо новую версию файла целиком.
+    Права существующего файла сохраняются.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            mode = stat.S_IMODE(os.stat(path).st_mode)
+        except FileNotFoundError:
+            mode = 0o666 & ~_UMASK
+        os.chmod(tmp_path, mode)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
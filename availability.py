@@ -0,0 +1,221 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# Долгосрочная доступность магазинов: результаты опроса копятся в памяти
+# и пачками пишутся в SQLite (WAL). Вместе с сырыми отсчётами в той же
+# транзакции обновляются итоги по минутам, часам и дням, у каждого уровня
+# свой срок хранения. Запрос за период читает только один уровень.
+AVAILABILITY_DB_PATH = r"availability.db"
+
+FLUSH_INTERVAL = 30  # сек между записями пачек
+PRUNE_INTERVAL = 3600  # сек между удалениями устаревших данных
+BUFFER_MAX = 200000  # отсчётов в памяти, если база недоступна
+
+DAY = 86400
+
+RAW_RETENTION = 2 * DAY  # сырые отсчёты
+
+# Уровень: имя, таблица, длина интервала (сек), срок хранения (сек, None — всегда)
+TIERS = [
+    ("1m", "rollup_1m", 60, 14 * DAY),
+    ("1h", "rollup_1h", 3600, 400 * DAY),
+    ("1d", "rollup_1d", DAY, None),
+]
+
+# Сколько интервалов на магазин читает один запрос: выбирается самый
+# подробный уровень, укладывающийся в этот предел
+MAX_BUCKETS = 1500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS raw (
+    store TEXT NOT NULL,
+    ts INTEGER NOT NULL,
+    status INTEGER NOT NULL,
+    PRIMARY KEY (store, ts)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS raw_ts ON raw (ts);
+""" + "".join(
+    f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    store TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    unknown INTEGER NOT NULL,
+    online INTEGER NOT NULL,
+    offline INTEGER NOT NULL,
+    PRIMARY KEY (store, bucket)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS {table}_bucket ON {table} (bucket);
+"""
+    for _, table, _, _ in TIERS
+)
+
+# Дни и часы считаются по местному времени сервера
+UTC_OFFSET = int(datetime.now().astimezone().utcoffset().total_seconds())
+
+_lock = threading.Lock()
+_buffer = deque(maxlen=BUFFER_MAX)  # (магазин, epoch, код Status)
+
+
+def connect(path=AVAILABILITY_DB_PATH, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+    else:
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(SCHEMA)
+    return conn
+
+
+def bucket_start(ts, step):
+    return ts - (ts + UTC_OFFSET) % step
+
+
+def record(store, ts, status):
+    """Запоминает результат опроса; в базу попадёт при следующем flush()."""
+    with _lock:
+        _buffer.append((store, ts, int(status)))
+
+
+def flush(path=AVAILABILITY_DB_PATH):
+    """Пишет накопленные отсчёты и добавляет их в итоги всех уровней."""
+    with _lock:
+        batch = list(_buffer)
+        _buffer.clear()
+    if not batch:
+        return
+
+    try:
+        conn = connect(path)
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO raw (store, ts, status) VALUES (?, ?, ?)",
+                    batch,
+                )
+                for _, table, step, _ in TIERS:
+                    conn.executemany(
+                        f"INSERT INTO {table} (store, bucket, unknown, online, offline) "
+                        "VALUES (?, ?, ?, ?, ?) "
+                        "ON CONFLICT (store, bucket) DO UPDATE SET "
+                        "unknown = unknown + excluded.unknown, "
+                        "online = online + excluded.online, "
+                        "offline = offline + excluded.offline",
+                        [
+                            (store, bucket, *counts)
+                            for (store, bucket), counts in aggregate(batch, step).items()
+                        ],
+                    )
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logging.error(f"Ошибка записи истории доступности: {e}")
+        # Возвращаем пачку в начало буфера, сколько поместится
+        with _lock:
+            room = BUFFER_MAX - len(_buffer)
+            if room > 0:
+                _buffer.extendleft(reversed(batch[-room:]))
+
+
+def aggregate(batch, step):
+    """(магазин, начало интервала) -> [unknown, online, offline]."""
+    result = {}
+    for store, ts, status in batch:
+        key = (store, bucket_start(ts, step))
+        counts = result.get(key)
+        if counts is None:
+            counts = result[key] = [0, 0, 0]
+        counts[status] += 1
+    return result
+
+
+def prune(path=AVAILABILITY_DB_PATH):
+    """Удаляет данные старше срока хранения своего уровня."""
+    if not os.path.exists(path):
+        return
+    now = int(time.time())
+    conn = connect(path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM raw WHERE ts < ?", (now - RAW_RETENTION,))
+            for _, table, _, retention in TIERS:
+                if retention is not None:
+                    conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (now - retention,))
+    finally:
+        conn.close()
+
+
+def pick_tier(start, end, max_buckets=MAX_BUCKETS):
+    """Самый подробный уровень, который ещё хранит start и даёт не больше
+    max_buckets интервалов за период."""
+    now = time.time()
+    for tier in TIERS:
+        _, _, step, retention = tier
+        if retention is not None and start < now - retention:
+            continue
+        if (end - start) / step <= max_buckets:
+            return tier
+    return TIERS[-1]
+
+
+def query(start, end, store=None, tier=None, path=AVAILABILITY_DB_PATH):
+    """Итоги по интервалам уровня за [start, end): (уровень, генератор строк).
+
+    Границы периода округляются до интервалов выбранного уровня.
+    """
+    tier = tier or pick_tier(start, end)
+    name, table, step, _ = tier
+
+    def rows():
+        if not os.path.exists(path):
+            return
+        sql = (
+            f"SELECT store, bucket, unknown, online, offline FROM {table} "
+            "WHERE bucket >= ? AND bucket < ?"
+        )
+        params = [bucket_start(int(start), step), int(end)]
+        if store:
+            sql += " AND store = ?"
+            params.append(store)
+        sql += " ORDER BY store, bucket"
+
+        conn = connect(path, readonly=True)
+        try:
+            for store_name, bucket, unknown, online, offline in conn.execute(sql, params):
+                yield {
+                    "store": store_name,
+                    "bucket": bucket,
+                    "unknown": unknown,
+                    "online": online,
+                    "offline": offline,
+                }
+        finally:
+            conn.close()
+
+    return name, rows()
+
+
+def sla(start, end, store=None, path=AVAILABILITY_DB_PATH):
+    """Доля отсчётов Online среди известных по магазинам за период."""
+    tier, rows = query(start, end, store, path=path)
+    totals = {}
+    for row in rows:
+        entry = totals.setdefault(row["store"], {"unknown": 0, "online": 0, "offline": 0})
+        entry["unknown"] += row["unknown"]
+        entry["online"] += row["online"]
+        entry["offline"] += row["offline"]
+    for entry in totals.values():
+        known = entry["online"] + entry["offline"]
+        entry["availability"] = round(entry["online"] * 100 / known, 3) if known else None
+    return tier, totals
+
+
+def tier_by_name(name):
+    for tier in TIERS:
+        if tier[0] == name:
+            return tier
+    raise KeyError(name)
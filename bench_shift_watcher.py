@@ -0,0 +1,352 @@
+import argparse
+import io
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import psycopg2
+import psycopg2.extensions
+
+import shift_watcher
+
+# Нагрузочный прогон shift_watcher на синтетических данных: заполняет
+# локальный PostgreSQL таблицами poscard_settings, user_entity и
+# doctransaction_entity в заданном масштабе, затем замеряет каждую выборку
+# и сборку отчёта — время, число строк, полученных с сервера, и пик памяти.
+#
+#   python bench_shift_watcher.py --shops 300 --users 2000 --tx-per-day 200000
+#
+# Подключение берётся из SHIFT_DB_* (см. shift_watcher.DB_CONFIG), базы
+# создаются отдельные, рабочие не трогаются.
+
+BENCH_MAIN_DB = "mag_serv_bench_main"
+BENCH_DOCS_DB = "mag_serv_bench_docs"
+
+# Доля транзакций смены (62/64) среди всех документов дня
+SHIFT_TX_SHARE = 0.1
+OTHER_TRANZTYPES = (1, 2, 11, 36)
+
+COPY_CHUNK = 50000
+
+SCHEMA_MAIN = """
+DROP TABLE IF EXISTS poscard_settings;
+DROP TABLE IF EXISTS user_entity;
+CREATE TABLE poscard_settings (id serial PRIMARY KEY, data jsonb NOT NULL);
+CREATE TABLE user_entity (id serial PRIMARY KEY, data jsonb NOT NULL);
+"""
+
+SCHEMA_DOCS = """
+DROP TABLE IF EXISTS doctransaction_entity;
+CREATE TABLE doctransaction_entity (
+    id bigserial PRIMARY KEY,
+    unitcode text NOT NULL,
+    seller text NOT NULL,
+    tranztype integer NOT NULL,
+    tranzdate timestamp NOT NULL
+);
+"""
+
+INDEX_DOCS = "CREATE INDEX ON doctransaction_entity (tranztype, tranzdate)"
+
+
+def admin_connect(dbname="postgres"):
+    return psycopg2.connect(
+        host=shift_watcher.DB_CONFIG["host"],
+        port=shift_watcher.DB_CONFIG["port"],
+        user=shift_watcher.DB_CONFIG["user"],
+        password=shift_watcher.DB_CONFIG["password"],
+        database=dbname,
+    )
+
+
+def ensure_database(name):
+    conn = admin_connect()
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (name,))
+            if cur.fetchone() is None:
+                cur.execute(f'CREATE DATABASE "{name}"')
+    finally:
+        conn.close()
+
+
+def copy_rows(cur, table, columns, rows):
+    """Заливает строки через COPY пачками по COPY_CHUNK."""
+    buf = io.StringIO()
+    count = 0
+    for row in rows:
+        buf.write("\t".join(row))
+        buf.write("\n")
+        count += 1
+        if count % COPY_CHUNK == 0:
+            buf.seek(0)
+            cur.copy_from(buf, table, columns=columns)
+            buf = io.StringIO()
+    buf.seek(0)
+    cur.copy_from(buf, table, columns=columns)
+    return count
+
+
+def jsonb_text(data):
+    # COPY в текстовом формате: экранируем обратную косую черту
+    return json.dumps(data, ensure_ascii=False).replace("\\", "\\\\")
+
+
+def shop_numbers(count):
+    numbers = []
+    n = 2
+    while len(numbers) < count:
+        if str(n) not in shift_watcher.EXCLUDED_SHOPS:
+            numbers.append(str(n))
+        n += 1
+    return numbers
+
+
+def populate(args):
+    rnd = random.Random(args.seed)
+    shops = shop_numbers(args.shops)
+    poscodes = [str(3000 + i) for i in range(len(shops))]
+    user_codes = [f"{10000 + i}" for i in range(args.users)]
+
+    ensure_database(BENCH_MAIN_DB)
+    ensure_database(BENCH_DOCS_DB)
+
+    conn = admin_connect(BENCH_MAIN_DB)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(SCHEMA_MAIN)
+            copy_rows(
+                cur,
+                "poscard_settings",
+                ("data",),
+                (
+                    (jsonb_text({"Shop": shop.zfill(3), "Code": code}),)
+                    for shop, code in zip(shops, poscodes)
+                ),
+            )
+            copy_rows(
+                cur,
+                "user_entity",
+                ("data",),
+                (
+                    (
+                        jsonb_text(
+                            {
+                                "Code": code,
+                                "Name": f"Кассир {code}",
+                                "Shop": rnd.choice(shops),
+                            }
+                        ),
+                    )
+                    for code in user_codes
+                ),
+            )
+    finally:
+        conn.close()
+
+    # Транзакции за args.days дней по сегодняшний включительно: выборка
+    # фильтрует по дате, так что объём прошлых дней влияет на скорость
+    today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def transactions():
+        for day in range(args.days):
+            start = today - timedelta(days=day)
+            for _ in range(args.tx_per_day):
+                if rnd.random() < SHIFT_TX_SHARE:
+                    tranztype = rnd.choice(shift_watcher.SHIFT_TRANZTYPES)
+                else:
+                    tranztype = rnd.choice(OTHER_TRANZTYPES)
+                tranzdate = start + timedelta(seconds=rnd.randrange(86400))
+                yield (
+                    rnd.choice(poscodes),
+                    rnd.choice(user_codes),
+                    str(tranztype),
+                    tranzdate.isoformat(sep=" "),
+                )
+
+    conn = admin_connect(BENCH_DOCS_DB)
+    try:
+        with conn, conn.cursor() as cur:
+            cur.execute(SCHEMA_DOCS)
+            t0 = time.perf_counter()
+            count = copy_rows(
+                cur,
+                "doctransaction_entity",
+                ("unitcode", "seller", "tranztype", "tranzdate"),
+                transactions(),
+            )
+            if args.index:
+                cur.execute(INDEX_DOCS)
+        conn.autocommit = True
+        with conn.cursor() as cur:
+            cur.execute("VACUUM ANALYZE doctransaction_entity")
+    finally:
+        conn.close()
+    return count, time.perf_counter() - t0
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+    """Считает строки результатов выборок, полученные с сервера.
+
+    Служебные однострочные запросы (отпечаток справочника, снимок) читаются
+    через fetchone и не учитываются, поэтому попадание в кэш даёт 0.
+    """
+
+    fetched = 0
+
+    def fetchall(self):
+        rows = super().fetchall()
+        CountingCursor.fetched += len(rows)
+        return rows
+
+
+# Исходное подключение: run_benchmarks подменяет его на counting_connect
+connect_to_db = shift_watcher.connect_to_db
+
+
+def counting_connect(dbname):
+    conn = connect_to_db(dbname)
+    if conn is not None:
+        conn.cursor_factory = CountingCursor
+    return conn
+
+
+def measure(func, repeat):
+    """Время каждого повтора без tracemalloc и пик памяти отдельным прогоном."""
+    times = []
+    result = None
+    for _ in range(repeat):
+        CountingCursor.fetched = 0
+        t0 = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - t0)
+    fetched = CountingCursor.fetched  # за последний повтор
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return result, times, peak, fetched
+
+
+def run_benchmarks(args):
+    shift_watcher.DB_CONFIG["main_db"] = BENCH_MAIN_DB
+    shift_watcher.DB_CONFIG["docs_db"] = BENCH_DOCS_DB
+    shift_watcher.connect_to_db = counting_connect
+
+    def cold(fetch):
+        # Без кэша справочников: замер самой выборки
+        def run():
+            shift_watcher._ref_cache.clear()
+            return fetch()
+
+        return run
+
+    data = {}
+    steps = [
+        ("fetch_poscards", cold(shift_watcher.fetch_poscards)),
+        ("fetch_poscards (кэш)", shift_watcher.fetch_poscards),
+        ("fetch_users", cold(shift_watcher.fetch_users)),
+        ("fetch_users (кэш)", shift_watcher.fetch_users),
+        ("fetch_today_transactions(62)", lambda: shift_watcher.fetch_today_transactions(62)),
+        ("fetch_today_transactions(64)", lambda: shift_watcher.fetch_today_transactions(64)),
+        (
+            "generate_shift_report",
+            lambda: shift_watcher.generate_shift_report(
+                data["t62"], data["t64"], data["users"], data["poscards"]
+            ),
+        ),
+        (
+            "generate_rollups",
+            lambda: shift_watcher.generate_rollups(
+                data["t62"], data["t64"], data["users"], data["poscards"]
+            ),
+        ),
+    ]
+    keys = {
+        "fetch_poscards": "poscards",
+        "fetch_users": "users",
+        "fetch_today_transactions(62)": "t62",
+        "fetch_today_transactions(64)": "t64",
+    }
+
+    results = []
+    for name, func in steps:
+        result, times, peak, fetched = measure(func, args.repeat)
+        if name in keys:
+            data[keys[name]] = result
+        results.append(
+            {
+                "step": name,
+                # Строки с сервера; у этапов без запросов к базе — прочерк
+                "rows": fetched if name.startswith("fetch_") else None,
+                "min": min(times),
+                "median": statistics.median(times),
+                "peak_kib": peak / 1024,
+            }
+        )
+    return results
+
+
+def format_results(args, results, loaded=None):
+    lines = [
+        f"shift_watcher benchmark {datetime.now().isoformat(timespec='seconds')}",
+        f"shops={args.shops} users={args.users} tx_per_day={args.tx_per_day} "
+        f"days={args.days} index={'yes' if args.index else 'no'} repeat={args.repeat}",
+    ]
+    if loaded:
+        count, elapsed = loaded
+        lines.append(f"загружено транзакций: {count} за {elapsed:.1f} сек")
+    lines.append(
+        f"{'этап':<32}{'строк с БД':>10}{'min, мс':>12}{'медиана, мс':>14}{'пик, КиБ':>12}"
+    )
+    for r in results:
+        rows = "—" if r["rows"] is None else r["rows"]
+        lines.append(
+            f"{r['step']:<32}{rows:>10}{r['min'] * 1000:>12.1f}"
+            f"{r['median'] * 1000:>14.1f}{r['peak_kib']:>12.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Нагрузочный прогон shift_watcher на синтетических данных"
+    )
+    parser.add_argument("--shops", type=int, default=200)
+    parser.add_argument("--users", type=int, default=1500)
+    parser.add_argument("--tx-per-day", type=int, default=100000)
+    parser.add_argument("--days", type=int, default=30, help="дней истории в таблице")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--index", action="store_true", help="индекс (tranztype, tranzdate)"
+    )
+    parser.add_argument(
+        "--no-populate",
+        action="store_true",
+        help="не пересоздавать данные, замерить на уже залитых",
+    )
+    parser.add_argument("--output", help="дописать результаты в файл")
+    args = parser.parse_args()
+
+    loaded = None
+    if not args.no_populate:
+        loaded = populate(args)
+
+    text = format_results(args, run_benchmarks(args), loaded)
+    print(text)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(text + "\n\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
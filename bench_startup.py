@@ -0,0 +1,194 @@
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from datetime import datetime
+
+# Замер времени запуска точек входа: исходников (python main.py и т.д.)
+# и собранных PyInstaller файлов из dist/, если они есть. Процесс
+# запускается во временном каталоге с копией shop_list.json, с включёнными
+# отметками этапов (startup_trace.py) и на отдельном порту.
+#
+#   python bench_startup.py --runs 5
+#   python bench_startup.py --frozen dist/start.exe --output bench_output.txt
+#
+# Этапы отсчитываются от запуска процесса: interpreter — интерпретатор
+# поднят (для onefile сюда входит распаковка), imports, http — сервер
+# слушает порт, first_page — первая страница получена, stores — список
+# магазинов загружен, assets, first_probe — первый опрос магазина.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_FILES = ["shop_list.json", "shops_smen.json"]
+
+PHASES = [
+    "interpreter",
+    "imports",
+    "http",
+    "first_page",
+    "stores",
+    "assets",
+    "first_probe",
+]
+
+# Точки входа: отвечает ли по HTTP и после какого этапа замер закончен
+ENTRY_POINTS = {
+    "main": {"http": True, "final": "first_probe"},
+    "start": {"http": True, "final": "first_probe"},
+    "ping": {"http": False, "final": "imports"},
+}
+
+POLL_INTERVAL = 0.02  # сек между попытками получить страницу
+
+
+def default_targets():
+    targets = []
+    for name in ENTRY_POINTS:
+        script = os.path.join(ROOT, f"{name}.py")
+        targets.append((f"{name}.py", name, [sys.executable, script]))
+    for name in ENTRY_POINTS:
+        for exe in (f"{name}.exe", name):
+            path = os.path.join(ROOT, "dist", exe)
+            if os.path.isfile(path):
+                targets.append((f"dist/{exe}", name, [path]))
+                break
+    return targets
+
+
+def kill_tree(proc):
+    """Останавливает процесс вместе с потомками (onefile запускает два процесса)."""
+    if proc.poll() is not None:
+        return
+    if os.name == "nt":
+        subprocess.run(
+            ["taskkill", "/T", "/F", "/PID", str(proc.pid)], capture_output=True
+        )
+    else:
+        os.killpg(proc.pid, signal.SIGKILL)
+    proc.wait()
+
+
+def run_once(cmd, entry, port, timeout):
+    workdir = tempfile.mkdtemp(prefix="mag_serv_startup_")
+    for name in DATA_FILES:
+        if os.path.exists(os.path.join(ROOT, name)):
+            shutil.copy(os.path.join(ROOT, name), workdir)
+
+    env = dict(os.environ, MAG_SERV_STARTUP_TRACE="1", MAG_SERV_PORT=str(port))
+    marks = {}
+    done = threading.Event()
+
+    started = time.time()
+    proc = subprocess.Popen(
+        cmd,
+        cwd=workdir,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        encoding="utf-8",
+        errors="replace",
+        start_new_session=os.name != "nt",
+    )
+
+    def read_marks():
+        for line in proc.stderr:
+            parts = line.split()
+            if len(parts) == 3 and parts[0] == "STARTUP":
+                marks[parts[1]] = float(parts[2]) - started
+                if parts[1] == entry["final"]:
+                    done.set()
+        done.set()
+
+    reader = threading.Thread(target=read_marks, daemon=True)
+    reader.start()
+
+    try:
+        deadline = started + timeout
+        if entry["http"]:
+            url = f"http://127.0.0.1:{port}/"
+            while time.time() < deadline and proc.poll() is None:
+                try:
+                    with urllib.request.urlopen(url, timeout=1) as response:
+                        if response.status == 200:
+                            marks["first_page"] = time.time() - started
+                            break
+                except OSError:
+                    time.sleep(POLL_INTERVAL)
+        done.wait(max(0, deadline - time.time()))
+    finally:
+        kill_tree(proc)
+        reader.join(timeout=1)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return marks
+
+
+def benchmark(targets, runs, port, timeout):
+    results = []
+    for label, name, cmd in targets:
+        samples = [run_once(cmd, ENTRY_POINTS[name], port, timeout) for _ in range(runs)]
+        phases = {}
+        for phase in PHASES:
+            values = [s[phase] for s in samples if phase in s]
+            if values:
+                phases[phase] = (statistics.median(values), len(values))
+        results.append((label, phases))
+    return results
+
+
+def format_results(results, runs):
+    lines = [
+        f"startup benchmark {datetime.now().isoformat(timespec='seconds')}, "
+        f"медиана по {runs} запускам, сек от старта процесса"
+    ]
+    lines.append(f"{'точка входа':<18}" + "".join(f"{p:>13}" for p in PHASES))
+    for label, phases in results:
+        cells = []
+        for phase in PHASES:
+            if phase not in phases:
+                cells.append(f"{'—':>13}")
+                continue
+            median, count = phases[phase]
+            mark = "" if count == runs else "*"
+            cells.append(f"{median:>12.3f}{mark or ' '}")
+        lines.append(f"{label:<18}" + "".join(cells))
+    lines.append("* этап отмечен не во всех запусках")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска точек входа")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=30, help="сек на один запуск")
+    parser.add_argument(
+        "--frozen",
+        action="append",
+        default=[],
+        help="путь к собранному файлу (main, start или ping), можно несколько раз",
+    )
+    parser.add_argument("--output", help="дописать результаты в файл")
+    args = parser.parse_args()
+
+    targets = default_targets()
+    for path in args.frozen:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if name not in ENTRY_POINTS:
+            parser.error(f"{path}: ожидается main, start или ping")
+        targets.append((path, name, [os.path.abspath(path)]))
+
+    text = format_results(benchmark(targets, args.runs, args.port, args.timeout), args.runs)
+    print(text)
+    if args.output:
+        with open(args.output, "a", encoding="utf-8") as f:
+            f.write(text + "\n\n")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
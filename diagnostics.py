@@ -0,0 +1,180 @@
+import platform
+import re
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Диагностика по запросу: серия пингов с подсчётом потерь и трассировка.
+# Работает в своём небольшом пуле, отдельно от опроса магазинов, так что
+# даже зависшие трассировки не задерживают 10-секундный цикл.
+
+DIAG_WORKERS = 4
+DIAG_QUEUE_MAX = 16  # заданий в работе и в очереди одновременно
+RESULT_TTL = 60  # сек, сколько отдаём готовый результат без нового прогона
+
+LOSS_PROBES = 10
+LOSS_PROBE_INTERVAL = 0.2  # сек между пингами серии
+TRACE_MAX_HOPS = 20
+
+_executor = ThreadPoolExecutor(max_workers=DIAG_WORKERS, thread_name_prefix="diag")
+_lock = threading.Lock()
+_jobs = {}  # магазин -> {"ip", "started", "finished", "result"}
+
+WINDOWS = platform.system().lower() == "windows"
+
+
+class DiagnosticsBusy(Exception):
+    pass
+
+
+def _run(cmd, timeout):
+    """Вывод команды и ошибка запуска: (stdout, None) или ("", текст ошибки)."""
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        return result.stdout, None
+    except subprocess.TimeoutExpired as e:
+        output = e.stdout or ""
+        if isinstance(output, bytes):
+            output = output.decode(errors="replace")
+        return output, None
+    except OSError as e:
+        return "", f"Ошибка запуска {cmd[0]}: {e}"
+
+
+def loss_test(ip, count=LOSS_PROBES):
+    """Серия пингов: процент потерь и время ответа (мин/сред/макс, мс)."""
+    if WINDOWS:
+        cmd = ["ping", "-n", str(count), "-w", "1000", ip]
+    else:
+        cmd = ["ping", "-c", str(count), "-i", str(LOSS_PROBE_INTERVAL), "-W", "1", ip]
+    output, error = _run(cmd, timeout=count * 2 + 5)
+
+    result = {
+        "target": ip,
+        "sent": count,
+        "loss_percent": None,
+        "rtt_ms": None,
+        "error": error,
+    }
+    loss = re.search(r"(\d+(?:\.\d+)?)%", output)
+    if loss:
+        result["loss_percent"] = float(loss.group(1))
+
+    rtt = re.search(r"= ([\d.]+)/([\d.]+)/([\d.]+)", output)
+    if rtt:
+        low, avg, high = rtt.groups()
+    else:
+        # Windows: "Минимальное = 1мсек, Максимальное = 3 мсек, Среднее = 2 мсек"
+        values = re.findall(r"=\s*(\d+)\s*(?:ms|мсек)", output)
+        low, high, avg = values[-3:] if len(values) >= 3 else (None, None, None)
+    if avg is not None:
+        result["rtt_ms"] = {"min": float(low), "avg": float(avg), "max": float(high)}
+    return result
+
+
+def trace(ip, max_hops=TRACE_MAX_HOPS):
+    """Трассировка до адреса: узлы по порядку, без разрешения имён."""
+    if WINDOWS:
+        cmd = ["tracert", "-d", "-h", str(max_hops), "-w", "1000", ip]
+    else:
+        cmd = ["traceroute", "-n", "-m", str(max_hops), "-w", "1", "-q", "1", ip]
+    output, error = _run(cmd, timeout=max_hops * 3 + 5)
+
+    hops = []
+    for line in output.splitlines():
+        match = re.match(r"\s*(\d+)\s+(.*)", line)
+        if not match:
+            continue
+        address = re.search(r"(\d+\.\d+\.\d+\.\d+)", match.group(2))
+        rtt = re.search(r"(\d+(?:\.\d+)?)\s*(?:ms|мс)", match.group(2))
+        hops.append(
+            {
+                "hop": int(match.group(1)),
+                "ip": address.group(1) if address else None,
+                "rtt_ms": float(rtt.group(1)) if rtt else None,
+            }
+        )
+    return {
+        "target": ip,
+        "hops": hops,
+        "reached": bool(hops) and hops[-1]["ip"] == ip,
+        "error": error,
+    }
+
+
+def router_ip(ip):
+    return f"{'.'.join(ip.split('.')[:3])}.254"
+
+
+def diagnose(ip, vpn):
+    result = {"store": loss_test(ip)}
+    if vpn == "Новая VPN":
+        result["router"] = loss_test(router_ip(ip))
+    result["trace"] = trace(ip)
+    return result
+
+
+def _finished(job, future):
+    error = future.exception()
+    with _lock:
+        job["finished"] = time.time()
+        job["result"] = (
+            {"error": f"{type(error).__name__}: {error}"} if error else future.result()
+        )
+
+
+def submit(store, ip, vpn):
+    """Запускает диагностику магазина или присоединяется к уже идущей.
+
+    Готовый результат моложе RESULT_TTL отдаётся без нового прогона.
+    """
+    with _lock:
+        job = _jobs.get(store)
+        if job is not None and (
+            job["finished"] is None or time.time() - job["finished"] < RESULT_TTL
+        ):
+            return describe(store, job)
+
+        running = sum(1 for j in _jobs.values() if j["finished"] is None)
+        if running >= DIAG_QUEUE_MAX:
+            raise DiagnosticsBusy()
+
+        # Старые результаты больше не нужны
+        now = time.time()
+        for name in [
+            name
+            for name, j in _jobs.items()
+            if j["finished"] is not None and now - j["finished"] >= RESULT_TTL
+        ]:
+            del _jobs[name]
+
+        job = {"ip": ip, "started": now, "finished": None, "result": None}
+        _jobs[store] = job
+        future = _executor.submit(diagnose, ip, vpn)
+    future.add_done_callback(lambda f: _finished(job, f))
+    with _lock:
+        return describe(store, job)
+
+
+def status(store):
+    with _lock:
+        job = _jobs.get(store)
+        return describe(store, job) if job is not None else None
+
+
+def describe(store, job):
+    finished = job["finished"]
+    return {
+        "store": store,
+        "ip": job["ip"],
+        "state": "running" if finished is None else "done",
+        "started": datetime.fromtimestamp(job["started"]).isoformat(timespec="seconds"),
+        "finished": (
+            datetime.fromtimestamp(finished).isoformat(timespec="seconds")
+            if finished is not None
+            else None
+        ),
+        "result": job["result"],
+    }
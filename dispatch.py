@@ -0,0 +1,144 @@
+import heapq
+import ipaddress
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+
+# Вместо пачки пингов в начале каждого интервала опросы распределяются
+# по интервалу равномерно: у каждого магазина своя случайная фаза,
+# а период опроса магазина остаётся равным интервалу.
+
+PROBE_WORKERS = 20
+
+# Общий темп задаётся от числа магазинов с запасом, чтобы опоздавшие
+# опросы могли догнать расписание, но не больше MAX_RATE в секунду
+RATE_HEADROOM = 1.5
+MAX_RATE = 100
+BURST = 3
+
+# Отдельный предел на подсеть: все магазины за одним концентратором VPN.
+# Должен быть выше (магазинов в подсети / интервал), иначе период растянется
+SUBNET_PREFIX = 16
+SUBNET_RATE = 80  # опросов в секунду на подсеть
+
+
+class TokenBucket:
+    """Маркерная корзина: rate маркеров в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        """Забирает маркер и возвращает, сколько секунд нужно подождать."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        return 0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+@lru_cache(maxsize=4096)
+def subnet_of(ip):
+    try:
+        return str(ipaddress.ip_network(f"{ip}/{SUBNET_PREFIX}", strict=False))
+    except ValueError:
+        return None
+
+
+_rate_warnings = set()
+
+
+def check_subnet_rates(targets, interval):
+    counts = {}
+    for data in list(targets.values()):
+        subnet = subnet_of(data.ip)
+        counts[subnet] = counts.get(subnet, 0) + 1
+    for subnet, count in counts.items():
+        if count / interval > SUBNET_RATE and subnet not in _rate_warnings:
+            _rate_warnings.add(subnet)
+            logging.warning(
+                f"Подсеть {subnet}: {count} магазинов не успеть опросить "
+                f"за {interval} сек при пределе {SUBNET_RATE} опросов/сек"
+            )
+
+
+def run(targets, probe, interval, stop=None):
+    """Опрашивает магазины с периодом interval, пока не выставлен stop.
+
+    targets — словарь магазин -> запись с полем ip (читается на каждом шаге, так что
+    добавленные и удалённые магазины подхватываются на лету),
+    probe(store, data) — проверка одного магазина.
+    """
+    stop = stop or threading.Event()
+    schedule = []  # куча (время, магазин)
+    scheduled = set()
+    in_flight = set()
+    in_flight_lock = threading.Lock()
+    global_bucket = TokenBucket(1, BURST)
+    subnet_buckets = {}
+    next_sync = 0
+
+    def finished(store, future):
+        with in_flight_lock:
+            in_flight.discard(store)
+        error = future.exception()
+        if error is not None:
+            logging.error(f"Ошибка опроса {store}: {error}")
+
+    with ThreadPoolExecutor(max_workers=PROBE_WORKERS) as executor:
+        while not stop.is_set():
+            now = time.monotonic()
+
+            # Раз в интервал подхватываем новые магазины и пересчитываем темп
+            if now >= next_sync:
+                for store in targets.keys() - scheduled:
+                    heapq.heappush(schedule, (now + random.uniform(0, interval), store))
+                    scheduled.add(store)
+                global_bucket.rate = min(
+                    MAX_RATE, max(1, len(targets) / interval * RATE_HEADROOM)
+                )
+                check_subnet_rates(targets, interval)
+                next_sync = now + interval
+
+            if not schedule:
+                stop.wait(min(interval, next_sync - now))
+                continue
+
+            due, store = schedule[0]
+            if due > now:
+                stop.wait(min(due, next_sync) - now)
+                continue
+            heapq.heappop(schedule)
+
+            data = targets.get(store)
+            if data is None:
+                scheduled.discard(store)
+                continue
+
+            # Сильно опоздавший опрос не догоняет пропущенные такты пачкой
+            next_due = due + interval
+            if next_due < now:
+                next_due = now + random.uniform(0, interval)
+            heapq.heappush(schedule, (next_due, store))
+
+            with in_flight_lock:
+                if store in in_flight:
+                    continue  # предыдущий опрос ещё не закончился
+                in_flight.add(store)
+
+            subnet = subnet_of(data.ip)
+            bucket = subnet_buckets.get(subnet)
+            if bucket is None:
+                bucket = subnet_buckets[subnet] = TokenBucket(SUBNET_RATE, BURST)
+            wait = max(global_bucket.reserve(), bucket.reserve())
+            if wait and stop.wait(wait):
+                break
+
+            future = executor.submit(probe, store, data)
+            future.add_done_callback(lambda f, s=store: finished(s, f))
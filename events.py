@@ -0,0 +1,217 @@
+import glob
+import json
+import logging
+import os
+import threading
+import time
+import urllib.request
+from collections import deque
+from datetime import date, datetime, timedelta
+
+# Переход считается состоявшимся только после N одинаковых результатов подряд,
+# чтобы единичная потеря пакета не порождала пару событий down/up
+FAIL_THRESHOLD = 3
+RECOVER_THRESHOLD = 2
+
+# Очередь событий ограничена: при переполнении теряются самые старые
+QUEUE_MAX = 5000
+
+# Однотипные события одной группы (общий узел связи) в пределах пакета
+# сворачиваются в одно уведомление, если их не меньше COALESCE_MIN
+COALESCE_MIN = 5
+
+FLUSH_INTERVAL = 15  # сек между отправками пакетов
+
+EVENTS_FILE_PATH = r"events.ndjson"
+# Файл событий переименовывается в events.ndjson.YYYY-MM-DD[.N] со сменой
+# дня или по достижении предела размера; архивы хранятся столько же, сколько
+# поминутная история доступности
+EVENTS_FILE_MAX_BYTES = 50 * 1024 * 1024
+EVENTS_RETENTION_DAYS = 14
+WEBHOOK_URL = None  # например "http://127.0.0.1:8080/hook"
+WEBHOOK_TIMEOUT = 5
+
+_lock = threading.Lock()
+_states = {}  # магазин -> подтверждённое состояние и счётчик серии
+_queue = deque(maxlen=QUEUE_MAX)
+_dropped = 0
+
+
+def observe(store, status, router, group=None):
+    """Принимает результат опроса магазина, ставит событие в очередь при переходе."""
+    global _dropped
+
+    with _lock:
+        state = _states.get(store)
+        if state is None:
+            # Первый результат задаёт исходное состояние без события
+            _states[store] = {
+                "status": status,
+                "router": router,
+                "candidate": None,
+                "streak": 0,
+            }
+            return
+
+        if status == state["status"] and router == state["router"]:
+            state["candidate"] = None
+            state["streak"] = 0
+            return
+
+        # Для смены статуса вердикт роутера внутри серии может меняться,
+        # смена одного вердикта роутера тоже требует серии подтверждений
+        candidate = status if status != state["status"] else (status, router)
+        if candidate != state["candidate"]:
+            state["candidate"] = candidate
+            state["streak"] = 0
+        state["streak"] += 1
+
+        if status == state["status"]:
+            threshold, kind = FAIL_THRESHOLD, "router"
+        elif status == "Offline":
+            threshold, kind = FAIL_THRESHOLD, "down"
+        else:
+            threshold, kind = RECOVER_THRESHOLD, "up"
+        if state["streak"] < threshold:
+            return
+
+        event = {
+            "ts": time.time(),
+            "kind": kind,
+            "store": store,
+            "group": group,
+            "status": status,
+            "router": router,
+            "prev_status": state["status"],
+            "prev_router": state["router"],
+        }
+        state.update(status=status, router=router, candidate=None, streak=0)
+
+        if len(_queue) == _queue.maxlen:
+            _dropped += 1
+        _queue.append(event)
+
+
+def forget(store):
+    with _lock:
+        _states.pop(store, None)
+
+
+def coalesce(batch):
+    """Сворачивает массовые события одной группы в одно уведомление."""
+    by_key = {}
+    for event in batch:
+        by_key.setdefault((event["kind"], event["group"]), []).append(event)
+
+    notifications = []
+    for (kind, group), events in by_key.items():
+        if group is not None and kind != "router" and len(events) >= COALESCE_MIN:
+            notifications.append(
+                {
+                    "ts": events[0]["ts"],
+                    "kind": kind,
+                    "group": group,
+                    "count": len(events),
+                    "stores": sorted(e["store"] for e in events),
+                }
+            )
+        else:
+            notifications.extend(events)
+
+    notifications.sort(key=lambda n: n["ts"])
+    return notifications
+
+
+def format_notification(n):
+    if "count" in n:
+        verb = "недоступны" if n["kind"] == "down" else "снова в сети"
+        return f"{n['count']} магазинов ({n['group']}) {verb}: {', '.join(n['stores'])}"
+    if n["kind"] == "router":
+        return f"{n['store']}: роутер {n['prev_router']} → {n['router']}"
+    return f"{n['store']}: {n['prev_status']} → {n['status']} ({n['router']})"
+
+
+def log_sink(notifications):
+    for n in notifications:
+        logging.warning(f"Событие: {format_notification(n)}")
+
+
+def rotate(path, max_bytes=EVENTS_FILE_MAX_BYTES, retention_days=EVENTS_RETENTION_DAYS):
+    """Переносит файл в архив, если он за прошлый день или слишком велик,
+    и удаляет архивы старше retention_days."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return
+    day = datetime.fromtimestamp(stat.st_mtime).date()
+    if day == date.today() and stat.st_size < max_bytes:
+        return
+
+    target = f"{path}.{day.isoformat()}"
+    n = 0
+    while os.path.exists(target):
+        n += 1
+        target = f"{path}.{day.isoformat()}.{n}"
+    os.replace(path, target)
+
+    oldest = (date.today() - timedelta(days=retention_days)).isoformat()
+    for archive in glob.glob(glob.escape(path) + ".*"):
+        archive_day = archive[len(path) + 1 :][:10]
+        if archive_day < oldest:
+            os.remove(archive)
+
+
+def make_file_sink(path):
+    """Дописывает уведомления в файл, по одному JSON на строку."""
+
+    def file_sink(notifications):
+        rotate(path)
+        with open(path, "a", encoding="utf-8") as f:
+            for n in notifications:
+                f.write(json.dumps(n, ensure_ascii=False) + "\n")
+
+    return file_sink
+
+
+def make_webhook_sink(url, timeout=WEBHOOK_TIMEOUT):
+    """Отправляет пакет уведомлений одним POST-запросом с JSON-массивом."""
+
+    def webhook_sink(notifications):
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(notifications, ensure_ascii=False).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=timeout):
+            pass
+
+    return webhook_sink
+
+
+sinks = [log_sink, make_file_sink(EVENTS_FILE_PATH)]
+if WEBHOOK_URL:
+    sinks.append(make_webhook_sink(WEBHOOK_URL))
+
+
+def flush():
+    """Забирает накопленные события и отправляет их пакетом во все приёмники."""
+    global _dropped
+
+    with _lock:
+        batch = list(_queue)
+        _queue.clear()
+        dropped, _dropped = _dropped, 0
+
+    if not batch:
+        return
+
+    notifications = coalesce(batch)
+    if dropped:
+        logging.warning(f"Очередь событий переполнена, потеряно {dropped} событий")
+
+    for sink in sinks:
+        try:
+            sink(notifications)
+        except Exception as e:
+            logging.error(f"Ошибка доставки событий в {sink.__name__}: {e}")
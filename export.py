@@ -0,0 +1,42 @@
+import csv
+import json
+
+from flask import Response, abort, stream_with_context
+
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson; charset=utf-8",
+}
+
+
+class _Line:
+    """Псевдо-файл для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(_Line())
+    # BOM, чтобы Excel открыл кириллицу без мастера импорта
+    yield "\ufeff" + writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([row.get(field, "") for field in fields])
+
+
+def ndjson_lines(rows, fields):
+    for row in rows:
+        yield json.dumps({field: row.get(field) for field in fields}, ensure_ascii=False)
+        yield "\n"
+
+
+def stream(rows, fields, fmt, filename):
+    """Отдаёт строки генератора по мере готовности, без сборки ответа в памяти."""
+    if fmt not in FORMATS:
+        abort(404)
+
+    lines = csv_lines(rows, fields) if fmt == "csv" else ndjson_lines(rows, fields)
+    response = Response(stream_with_context(lines), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}.{fmt}"'
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
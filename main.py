@@ -1,14 +1,46 @@
-from flask import Flask, render_template_string, jsonify
-from apscheduler.schedulers.background import BackgroundScheduler
+import startup_trace
+
+startup_trace.mark("interpreter")
+
+from flask import Flask, render_template_string, jsonify, request, abort
+from werkzeug.serving import make_server
 import subprocess
 import platform
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import atexit
 import os
+import threading
+import time
 from datetime import datetime
 import json
 
+from atomic_file import dump_compact, write_atomic
+import assets
+import availability
+import diagnostics
+import dispatch
+import events
+import export
+import profiling
+import recording
+import shift_history
+import topology
+from store_state import (
+    ROUTER_BY_LABEL,
+    ROUTER_LABELS,
+    STATUS_BY_LABEL,
+    STATUS_LABELS,
+    Router,
+    PriorityIndex,
+    Status,
+    StatusCounters,
+    StoreRecord,
+)
+
 app = Flask(__name__)
+assets.init_app(app)
 
 # Настройка логирования
 logging.basicConfig(level=logging.INFO)
@@ -19,16 +51,55 @@ SHOP_LIST_PATH = r"shop_list.json"
 # Добавляем путь к файлу с информацией о сменах
 SHIFT_STATUS_PATH = r"shops_smen.json"
 
-# Загрузка IP магазинов из файла
+# Активность касс от shift_watcher: последняя транзакция и число за час
+SHOP_ACTIVITY_PATH = r"shop_activity.json"
+
+HOST = "0.0.0.0"
+PORT = int(os.environ.get("MAG_SERV_PORT", 80))
+
+# Период опроса магазинов, сек
+PING_INTERVAL = 10
+
+# У магазинов с резервными каналами ("backup" в shop_list.json) все адреса
+# пингуются одновременно в отдельном пуле, засчитывается первый ответ
+PATH_WORKERS = 20
+path_executor = ThreadPoolExecutor(max_workers=PATH_WORKERS, thread_name_prefix="path")
+
+# Сохранённое состояние опроса для быстрого старта после перезапуска
+PROBE_STATE_PATH = r"probe_state.json"
+CHECKPOINT_INTERVAL = 60  # сек
+CHECKPOINT_MAX_AGE = 24 * 3600  # более старый снимок не загружаем
+HISTORY_LENGTH = 20  # последних смен статуса на магазин
+
+# Загрузка IP магазинов из файла: магазин -> StoreRecord
 stores = {}
 last_modified_time = 0
 
+# Счётчики статусов для заголовка и /summary, обновляются при переходах
+counters = StatusCounters()
+
+# Офлайн при открытой смене, по длительности простоя — для /priority
+priority = PriorityIndex()
+
+# Последние смены статуса: магазин -> deque[(epoch, Status, Router)]
+store_history = {}
+
 # Добавляем глобальную переменную для хранения статусов смен
 shift_statuses = {}
+shift_last_modified_time = 0
+
+# Магазин -> (epoch последней транзакции, транзакций за последний час)
+shop_activity = {}
+activity_last_modified_time = 0
+
+scheduler = None
+
+# Состояние компонентов при запуске через start.py
+component_health = {}
 
 
 def load_store_ips():
-    global stores, last_modified_time
+    global last_modified_time
     try:
         current_modified_time = os.path.getmtime(SHOP_LIST_PATH)
         if current_modified_time <= last_modified_time:
@@ -36,38 +107,139 @@ def load_store_ips():
 
         last_modified_time = current_modified_time
 
-        temp_stores = {}
         if not os.path.exists(SHOP_LIST_PATH):
             logging.error("JSON файл списка магазинов не найден!")
             return
 
         with open(SHOP_LIST_PATH, "r", encoding="utf-8") as file:
             shops_data = json.load(file)
-            for shop in shops_data:
-                store = shop["name"]
-                ip = shop["ip"]
-                vpn_type = shop["vpn"]
-
-                # Сохраняем предыдущий статус
-                old_status = stores.get(store, {}).get("status", "Unknown")
-                old_router = stores.get(store, {}).get("router", "Unknown")
-
-                temp_stores[store] = {
-                    "ip": ip,
-                    "vpn": vpn_type,
-                    "status": old_status,
-                    "router": old_router,
-                    "last_updated": datetime.now().strftime("%H:%M:%S"),
-                }
 
-        stores.clear()
-        stores.update(temp_stores)
-        logging.info("Список магазинов обновлен из JSON.")
+        apply_store_list(shops_data)
 
     except Exception as e:
         logging.error(f"Ошибка при загрузке JSON файла: {e}")
 
 
+def apply_store_list(shops_data):
+    """Заменяет список магазинов, сохраняя уже известное состояние опроса."""
+    shops_data = [shop for shop in shops_data if shop.get("ip")]
+    names = {shop["name"] for shop in shops_data}
+    remove_stores(stores.keys() - names)
+    upsert_stores(shops_data)
+    logging.info("Список магазинов обновлен из JSON.")
+
+
+def upsert_stores(shops_data):
+    """Добавляет магазины или обновляет их адрес и тип VPN.
+
+    Словарь stores меняется на месте: его одновременно читает диспетчер
+    опроса, новые магазины он подхватит на ближайшей сверке расписания.
+    Магазины без адреса не опрашиваются и пропускаются.
+    """
+    for shop in shops_data:
+        store = shop["name"]
+        if not shop.get("ip"):
+            continue
+        backup = tuple((path["ip"], path["vpn"]) for path in shop.get("backup", ()))
+        record = stores.get(store)
+        if record is None:
+            record = StoreRecord(
+                shop["ip"], shop["vpn"], updated=time.time(), backup=backup
+            )
+            stores[store] = record
+        else:
+            record.ip = shop["ip"]
+            record.vpn = shop["vpn"]
+            record.backup = backup
+        counters.update(store, record.status, store_groups(store, record))
+
+
+def remove_stores(names):
+    for store in list(names):
+        if stores.pop(store, None) is None:
+            continue
+        events.forget(store)
+        counters.remove(store)
+        priority.remove(store)
+        store_history.pop(store, None)
+
+
+def save_probe_state():
+    """Сохраняет снимок состояния опроса в компактный JSON."""
+    snapshot = {}
+    for store, data in list(stores.items()):
+        if data.status == Status.UNKNOWN:
+            continue
+        # В файле подписи, а не коды: снимок переживает перенумерацию
+        snapshot[store] = {
+            "status": STATUS_LABELS[data.status],
+            "router": ROUTER_LABELS[data.router],
+            "updated": data.updated,
+            "changed": data.changed,
+            "history": [
+                (ts, STATUS_LABELS[status], ROUTER_LABELS[router])
+                for ts, status, router in list(store_history.get(store, ()))
+            ],
+        }
+    try:
+        write_atomic(
+            PROBE_STATE_PATH, dump_compact({"saved_at": time.time(), "stores": snapshot})
+        )
+    except OSError as e:
+        logging.error(f"Ошибка сохранения состояния опроса: {e}")
+
+
+def load_probe_state():
+    """Восстанавливает последнее известное состояние с пометкой stale.
+
+    Пометка снимается при первом свежем опросе магазина.
+    """
+    try:
+        with open(PROBE_STATE_PATH, "r", encoding="utf-8") as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        return
+    except Exception as e:
+        logging.error(f"Ошибка загрузки состояния опроса: {e}")
+        return
+
+    age = time.time() - state.get("saved_at", 0)
+    if age > CHECKPOINT_MAX_AGE:
+        logging.info("Сохранённое состояние опроса устарело, пропускаем.")
+        return
+
+    restored = 0
+    for store, saved in state.get("stores", {}).items():
+        data = stores.get(store)
+        if data is None or data.status != Status.UNKNOWN:
+            continue
+        data.status = STATUS_BY_LABEL.get(saved["status"], Status.UNKNOWN)
+        data.router = ROUTER_BY_LABEL.get(saved["router"], Router.UNKNOWN)
+        # Снимки старого формата хранили время строкой, берём время снимка
+        data.updated = saved.get("updated", state["saved_at"])
+        data.changed = saved.get("changed")
+        data.stale = True
+        counters.update(store, data.status)
+        if data.status == Status.OFFLINE:
+            priority.set_offline(store, data.changed or data.updated)
+        store_history[store] = deque(
+            (
+                (
+                    ts,
+                    STATUS_BY_LABEL.get(status, Status.UNKNOWN),
+                    ROUTER_BY_LABEL.get(router, Router.UNKNOWN),
+                )
+                for ts, status, router in saved.get("history", ())
+            ),
+            maxlen=HISTORY_LENGTH,
+        )
+        restored += 1
+
+    logging.info(
+        f"Восстановлено состояние {restored} магазинов (снимок {int(age)} сек назад)."
+    )
+
+
 def ping(target):
     param = "-n" if platform.system().lower() == "windows" else "-c"
     timeout = "-w" if platform.system().lower() == "windows" else "-W"
@@ -88,582 +260,274 @@ def ping(target):
 
 
 def check_store(store, data):
-    store_ip = data["ip"]
-    vpn_type = data["vpn"]
-
-    if ping(store_ip):
-        stores[store]["status"] = "Online"
-        stores[store]["router"] = "Работает"
-        stores[store]["last_updated"] = datetime.now().strftime("%H:%M:%S")
+    # За недоступным узлом связи магазин и его роутер заведомо не ответят,
+    # такие каналы не опрашиваем
+    paths = [
+        (ip, vpn)
+        for ip, vpn in ((data.ip, data.vpn), *data.backup)
+        if not hub_down(store, vpn)
+    ]
+    if not paths:
+        update_store_state(store, Status.OFFLINE, Router.UPSTREAM_DOWN)
         return
 
-    stores[store]["status"] = "Offline"
-    stores[store]["last_updated"] = datetime.now().strftime("%H:%M:%S")
-
-    if vpn_type == "Новая VPN":
-        router_ip = f"{'.'.join(store_ip.split('.')[:3])}.254"
-        if ping(router_ip):
-            stores[store]["router"] = "Касса не в сети"
-        else:
-            stores[store]["router"] = "Роутер не в сети"
-    else:
-        stores[store]["router"] = "Требуется проверка"
-
-
-def load_shift_statuses():
-    global shift_statuses
-    try:
-        if not os.path.exists(SHIFT_STATUS_PATH):
-            logging.error("JSON файл статусов смен не найден!")
-            return
-
-        with open(SHIFT_STATUS_PATH, "r", encoding="utf-8") as file:
-            shift_data = json.load(file)
-            shift_statuses = {shop["name"]: shop for shop in shift_data}
-
-        logging.info("Статусы смен обновлены из JSON.")
-    except Exception as e:
-        logging.error(f"Ошибка при загрузке JSON файла статусов смен: {e}")
-
-
-def ping_stores():
-    with ThreadPoolExecutor(max_workers=20) as executor:
-        executor.map(lambda s: check_store(s, stores[s]), stores.keys())
-
-
-# Настройка планировщика
-scheduler = BackgroundScheduler()
-scheduler.add_job(ping_stores, "interval", seconds=10)
-scheduler.add_job(load_store_ips, "interval", minutes=30)
-scheduler.add_job(load_shift_statuses, "interval", seconds=10)
-scheduler.start()
-
-# Загрузка данных перед стартом
-load_store_ips()
-load_shift_statuses()  # Добавляем загрузку статусов смен
-
-# Modern UI Template with Dark Mode
-html_template = """
-<!DOCTYPE html>
-<html lang="ru">
-<head>
-    <link rel="icon" href="{{ url_for('static', filename='img/favicon.png') }}" type="image/png">
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Мониторинг магазинов</title>
-    <link href="https://fonts.googleapis.com/css2?family=Roboto:wght@300;400;500;700&display=swap" rel="stylesheet">
-    <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0/css/all.min.css">
-    <script>
-        // Проверка системной темы
-        function getSystemTheme() {
-            return window.matchMedia && window.matchMedia('(prefers-color-scheme: dark)').matches ? 'dark' : 'light';
-        }
-
-        // Проверка сохраненной темы в localStorage
-        function getSavedTheme() {
-            return localStorage.getItem('theme');
-        }
-
-        // Установка темы
-        function setTheme(theme) {
-            document.documentElement.setAttribute('data-theme', theme);
-            localStorage.setItem('theme', theme);
-            updateThemeButton(theme);
-        }
-
-        // Обновление кнопки переключения темы
-        function updateThemeButton(theme) {
-            const btn = document.getElementById('theme-toggle');
-            if (btn) {
-                btn.innerHTML = theme === 'dark' 
-                    ? '<i class="fas fa-sun"></i>' 
-                    : '<i class="fas fa-moon"></i>';
-            }
-        }
-
-        // Инициализация темы при загрузке
-        function initTheme() {
-            const savedTheme = getSavedTheme();
-            const systemTheme = getSystemTheme();
-            const theme = savedTheme || systemTheme;
-            setTheme(theme);
-        }
-
-        // Переключение темы
-        function toggleTheme() {
-            const currentTheme = document.documentElement.getAttribute('data-theme');
-            const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
-            setTheme(newTheme);
-        }
-
-        document.addEventListener('DOMContentLoaded', initTheme);
-    </script>
-    <style>
-        :root {
-            --primary: #4361ee;
-            --primary-light: #5e7bf1;
-            --success: #4cc9f0;
-            --warning: #f8961e;
-            --danger: #f94144;
-
-            /* Light theme */
-            --bg-light: #f5f7fa;
-            --card-light: #ffffff;
-            --text-light: #212529;
-            --border-light: #e9ecef;
-            --muted-light: #6c757d;
-
-            /* Dark theme */
-            --bg-dark: #121212;
-            --card-dark: #1e1e1e;
-            --text-dark: #e0e0e0;
-            --border-dark: #333333;
-            --muted-dark: #9e9e9e;
-        }
-
-        [data-theme="light"] {
-            --bg: var(--bg-light);
-            --card: var(--card-light);
-            --text: var(--text-light);
-            --border: var(--border-light);
-            --muted: var(--muted-light);
-        }
-
-        [data-theme="dark"] {
-            --bg: var(--bg-dark);
-            --card: var(--card-dark);
-            --text: var(--text-dark);
-            --border: var(--border-dark);
-            --muted: var(--muted-dark);
-        }
-
-        * {
-    margin: 0;
-    padding: 0;
-    box-sizing: border-box;
-    transition: background-color 0.3s ease, color 0.3s ease, border-color 0.3s ease;
-}
-
-html, body {
-    transition: background-color 0.3s ease, color 0.3s ease;
-}
-
-        body {
-            font-family: 'Roboto', sans-serif;
-            background-color: var(--bg);
-            color: var(--text);
-            line-height: 1.6;
-        }
-
-        /* Стилизация скроллбара для прокручиваемой таблицы */
-div[style*="overflow-y: auto"]::-webkit-scrollbar {
-    width: 10px;
-    height: 10px;
-}
-
-div[style*="overflow-y: auto"]::-webkit-scrollbar-track {
-    background-color: var(--bg); /* Адаптивный фон под тему */
-    border-radius: 8px;
-}
-
-div[style*="overflow-y: auto"]::-webkit-scrollbar-thumb {
-    background-color: var(--muted); /* Цвет ползунка */
-    border-radius: 8px;
-    border: 2px solid transparent;
-    background-clip: content-box;
-    transition: background-color 0.3s ease;
-}
-
-div[style*="overflow-y: auto"]::-webkit-scrollbar-thumb:hover {
-    background-color: var(--primary); /* Синяя подсветка при наведении */
-}
-
-/* Firefox поддержка */
-div[style*="overflow-y: auto"] {
-    scrollbar-color: var(--muted) var(--bg);
-    scrollbar-width: thin;
-}
-
-        .container {
-            max-width: 1400px;
-            margin: 0 auto;
-            padding: 20px;
-        }
-
-        header {
-            background: linear-gradient(135deg, var(--primary) 0%, #3a0ca3 100%);
-            color: white;
-            padding: 20px 0;
-            box-shadow: 0 4px 12px rgba(0,0,0,0.1);
-            margin-bottom: 30px;
-        }
-
-        .header-content {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-        }
-
-        .logo {
-            display: flex;
-            align-items: center;
-            font-size: 1.5rem;
-            font-weight: 700;
-        }
-
-        .logo i {
-            margin-right: 10px;
-            font-size: 1.8rem;
-        }
-
-        .header-actions {
-            display: flex;
-            align-items: center;
-            gap: 15px;
-        }
-
-        .theme-toggle {
-            background: rgba(255,255,255,0.2);
-            border: none;
-            color: white;
-            padding: 8px 12px;
-            border-radius: 6px;
-            cursor: pointer;
-            display: flex;
-            align-items: center;
-            gap: 8px;
-            font-family: inherit;
-        }
-
-        .theme-toggle:hover {
-            background: rgba(255,255,255,0.3);
-        }
-
-        .stats {
-            display: flex;
-            gap: 20px;
-        }
-
-        .stat-card {
-            background: rgba(255,255,255,0.2);
-            padding: 10px 15px;
-            border-radius: 8px;
-            display: flex;
-            align-items: center;
-        }
-
-        .stat-card i {
-            margin-right: 8px;
-        }
-
-        .dashboard {
-            display: grid;
-            grid-template-columns: 250px 1fr;
-            gap: 20px;
-        }
-
-        .sidebar {
-    background: var(--card);
-    border-radius: 10px;
-    padding: 20px;
-    box-shadow: 0 2px 10px rgba(0, 0, 0, 0.05);
-    height: fit-content;
-    border: 1px solid var(--border);
-    transition:
-        box-shadow 0.4s ease,
-        border-color 0.4s ease,
-        background-color 0.4s ease;
-}
-
-.sidebar:hover {
-    box-shadow: 0 0 15px rgba(67, 97, 238, 0.4);
-    border-color: var(--primary);
-}
-
-        .sidebar h3 {
-            margin-bottom: 15px;
-            color: var(--primary);
-            font-size: 1.1rem;
-        }
-
-        .filter-group {
-            margin-bottom: 20px;
-        }
-
-        .filter-group label {
-            display: block;
-            margin-bottom: 8px;
-            font-weight: 500;
-            color: var(--text);
-        }
+    via = race_paths(paths)
+    if via is not None:
+        update_store_state(store, Status.ONLINE, Router.OK, via)
+        return
 
-        select, input {
-            width: 100%;
-            padding: 8px 12px;
-            border: 1px solid var(--border);
-            border-radius: 6px;
-            font-family: inherit;
-            background: var(--card);
-            color: var(--text);
-        }
+    router = Router.NEEDS_CHECK
+    for ip, vpn in paths:
+        if vpn == "Новая VPN":
+            router_ip = f"{'.'.join(ip.split('.')[:3])}.254"
+            if ping(router_ip):
+                router = Router.CASHBOX_DOWN
+            else:
+                router = Router.ROUTER_DOWN
+            break
 
-        .main-content {
-    background: var(--card);
-    border-radius: 10px;
-    padding: 20px;
-    box-shadow: 0 2px 10px rgba(0, 0, 0, 0.05);
-    border: 1px solid var(--border);
-    transition:
-        box-shadow 0.4s ease,
-        border-color 0.4s ease,
-        background-color 0.4s ease;
-}
-
-.main-content:hover {
-    box-shadow: 0 0 15px rgba(67, 97, 238, 0.4);
-    border-color: var(--primary);
-}
-
-        .table-header {
-            display: flex;
-            justify-content: space-between;
-            align-items: center;
-            margin-bottom: 20px;
-        }
+    update_store_state(store, Status.OFFLINE, router)
 
-        .table-header h2 {
-            color: var(--text);
-        }
 
-        .search-box {
-            position: relative;
-            width: 300px;
-        }
+def hub_down(store, vpn):
+    hub = topology.hub_for(store, vpn)
+    return hub is not None and topology.down_hub(hub) is not None
 
-        .search-box input {
-            padding-left: 35px;
-        }
 
-        .search-box i {
-            position: absolute;
-            left: 12px;
-            top: 50%;
-            transform: translateY(-50%);
-            color: var(--muted);
-        }
+def race_paths(paths):
+    """Пингует адреса [(ip, vpn)] одновременно и возвращает первый ответивший.
 
-        table {
-            width: 100%;
-            border-collapse: collapse;
-        }
+    Один адрес пингуется прямо в потоке опроса. Опоздавшие пинги
+    досчитываются в пуле, их результат не нужен.
+    """
+    if len(paths) == 1:
+        ip = paths[0][0]
+        return ip if ping(ip) else None
+    futures = {path_executor.submit(ping, ip): ip for ip, _ in paths}
+    for future in as_completed(futures):
+        if future.result():
+            return futures[future]
+    return None
 
-        th {
-            text-align: left;
-            padding: 12px 15px;
-            background-color: var(--primary);
-            color: white;
-            font-weight: 500;
-            text-transform: uppercase;
-            font-size: 0.8rem;
-            letter-spacing: 0.5px;
-        }
 
-        td {
-            padding: 15px;
-            border-bottom: 1px solid var(--border);
-            vertical-align: middle;
-            color: var(--text);
-        }
+def update_store_state(store, status, router, via=None):
+    """Записывает результат опроса магазина (коды Status и Router).
 
-        tr:last-child td {
-            border-bottom: none;
-        }
+    via — адрес, по которому магазин ответил.
+    """
+    data = stores.get(store)
+    if data is None:
+        return
 
-        .status {
-            display: inline-flex;
-            align-items: center;
-            padding: 5px 12px;
-            border-radius: 20px;
-            font-size: 0.85rem;
-            font-weight: 500;
-        }
+    now = time.time()
+    if status != data.status or router != data.router:
+        if status != data.status:
+            counters.update(store, status)
+            priority.set_offline(store, now if status == Status.OFFLINE else None)
+        data.changed = now
+        store_history.setdefault(store, deque(maxlen=HISTORY_LENGTH)).append(
+            (int(now), status, router)
+        )
 
-        .status i {
-            margin-right: 5px;
-            font-size: 0.7rem;
-        }
+        # Сверка или обновление адресов могли убрать магазин, пока шёл опрос:
+        # тогда отменяем то, что вернуло его в счётчики
+        current = stores.get(store)
+        if current is not data:
+            if current is None:
+                counters.remove(store)
+                priority.remove(store)
+                store_history.pop(store, None)
+            else:
+                counters.update(store, current.status, store_groups(store, current))
+                offline = current.status == Status.OFFLINE
+                priority.set_offline(store, current.changed if offline else None)
+            return
 
-        .online {
-            background-color: rgba(76, 201, 240, 0.1);
-            color: var(--success);
-        }
+    data.status = status
+    data.router = router
+    data.via = via
+    data.updated = now
+    data.stale = False
+    availability.record(store, int(now), status)
+    recording.probe(store, data, status, router, via, now)
+    startup_trace.mark("first_probe")
+
+    events.observe(
+        store,
+        STATUS_LABELS[status],
+        ROUTER_LABELS[router],
+        group=store_group(store, data),
+    )
 
-        .online i {
-            color: var(--success);
-        }
 
-        .offline {
-            background-color: rgba(249, 65, 68, 0.1);
-            color: var(--danger);
-        }
+def store_group(store, data):
+    """Группа для сворачивания массовых событий: общий узел связи."""
+    return topology.hub_for(store, data.vpn) or data.vpn
 
-        .offline i {
-            color: var(--danger);
-        }
 
-        .unknown {
-            background-color: rgba(248, 150, 30, 0.1);
-            color: var(--warning);
-        }
+def store_groups(store, data):
+    """Группы магазина в счётчиках /summary: VPN, подсеть, открыта ли смена."""
+    is_open = shift_statuses.get(store, {}).get("is_shift_open", False)
+    groups = [("vpn", data.vpn), ("shift", "open" if is_open else "closed")]
+    subnet = dispatch.subnet_of(data.ip)
+    if subnet is not None:
+        groups.append(("subnet", subnet))
+    return tuple(groups)
 
-        .router-status {
-            display: flex;
-            align-items: center;
-        }
 
-        .router-status i {
-            margin-right: 8px;
-        }
+def load_shift_statuses():
+    global shift_last_modified_time
+    try:
+        if not os.path.exists(SHIFT_STATUS_PATH):
+            logging.error("JSON файл статусов смен не найден!")
+            return
 
-        .fa-check-circle {
-            color: var(--success);
-        }
+        # shift_watcher переписывает файл только при изменениях
+        current_modified_time = os.path.getmtime(SHIFT_STATUS_PATH)
+        if current_modified_time == shift_last_modified_time:
+            return
+        shift_last_modified_time = current_modified_time
 
-        .fa-exclamation-circle {
-            color: var(--warning);
-        }
+        with open(SHIFT_STATUS_PATH, "r", encoding="utf-8") as file:
+            shift_data = json.load(file)
 
-        .fa-times-circle {
-            color: var(--danger);
-        }
+        ingest_shift_statuses({shop["name"]: shop for shop in shift_data})
+        logging.info("Статусы смен обновлены из JSON.")
+    except Exception as e:
+        logging.error(f"Ошибка при загрузке JSON файла статусов смен: {e}")
 
-        .last-updated {
-            color: var(--muted);
-            font-size: 0.85rem;
-        }
 
-        .refresh-info {
-            text-align: right;
-            margin-top: 10px;
-            color: var(--muted);
-            font-size: 0.85rem;
-        }
+def load_shop_activity():
+    global activity_last_modified_time
+    try:
+        current_modified_time = os.path.getmtime(SHOP_ACTIVITY_PATH)
+    except OSError:
+        return
+    if current_modified_time == activity_last_modified_time:
+        return
+    activity_last_modified_time = current_modified_time
 
-        @media (max-width: 1200px) {
-            .dashboard {
-                grid-template-columns: 1fr;
-            }
+    try:
+        with open(SHOP_ACTIVITY_PATH, "r", encoding="utf-8") as file:
+            ingest_shop_activity(json.load(file))
+    except Exception as e:
+        logging.error(f"Ошибка при загрузке JSON файла активности магазинов: {e}")
 
-            .stats {
-                flex-wrap: wrap;
-            }
-        }
 
-        /* Анимации */
-        @keyframes fadeIn {
-            from { opacity: 0; transform: translateY(10px); }
-            to { opacity: 1; transform: translateY(0); }
-        }
+def ingest_shop_activity(activity):
+    """Принимает активность {магазин: {last_tx, tx_last_hour}} от shift_watcher."""
+    global shop_activity
+    shop_activity = {
+        shop: (
+            datetime.fromisoformat(data["last_tx"]).timestamp(),
+            data["tx_last_hour"],
+        )
+        for shop, data in activity.items()
+    }
+
+
+def activity_payload(store, now):
+    entry = shop_activity.get(store)
+    if entry is None:
+        return None
+    last_ts, tx_last_hour = entry
+    return {
+        "last_tx": datetime.fromtimestamp(last_ts).isoformat(timespec="seconds"),
+        "minutes_ago": max(0, int((now - last_ts) // 60)),
+        "tx_per_hour": tx_last_hour,
+    }
+
+
+def ingest_shift_report(report):
+    """Принимает отчёт shift_watcher напрямую, без файла (режим start.py)."""
+    ingest_shift_statuses(
+        {name: {"name": name, **data} for name, data in report.items()}
+    )
 
-        tr {
-            animation: fadeIn 0.3s ease-out forwards;
-            opacity: 0;
-        }
 
-        tr:nth-child(1) { animation-delay: 0.1s; }
-        tr:nth-child(2) { animation-delay: 0.2s; }
-        tr:nth-child(3) { animation-delay: 0.3s; }
-        tr:nth-child(4) { animation-delay: 0.4s; }
-        tr:nth-child(5) { animation-delay: 0.5s; }
+def ingest_shift_statuses(new_statuses):
+    global shift_statuses
+    old_statuses, shift_statuses = shift_statuses, new_statuses
+
+    # Пересчитываем группы только у магазинов, где открылась или закрылась смена
+    for store in old_statuses.keys() | new_statuses.keys():
+        was_open = old_statuses.get(store, {}).get("is_shift_open", False)
+        is_open = new_statuses.get(store, {}).get("is_shift_open", False)
+        if was_open == is_open:
+            continue
+        priority.set_shift(store, is_open)
+        data = stores.get(store)
+        if data is not None:
+            counters.update(store, groups=store_groups(store, data))
+
+
+def run_prober(stop=None):
+    """Опрашивает магазины, равномерно распределяя пинги по интервалу.
+
+    Узлы связи из карты сети опрашиваются отдельным потоком.
+    """
+    stop = stop or threading.Event()
+    topology.load()
+    threading.Thread(
+        target=topology.run, args=(ping, stop), name="hubs", daemon=True
+    ).start()
+    # check_store ищется при каждом вызове, чтобы его можно было профилировать
+    dispatch.run(stores, lambda store, data: check_store(store, data), PING_INTERVAL, stop)
+
+
+def start_scheduler(standalone=True):
+    """Запускает фоновые задачи.
+
+    standalone=False — опрос магазинов и смен ведёт start.py,
+    здесь остаются только вспомогательные задачи.
+    """
+    # APScheduler импортируется здесь: к этому моменту HTTP уже отвечает
+    from apscheduler.schedulers.background import BackgroundScheduler
+
+    global scheduler
+    scheduler = BackgroundScheduler()
+
+    def add_job(func, job_id, **trigger):
+        scheduler.add_job(
+            profiling.timed(job_id, func), "interval", id=job_id, **trigger
+        )
 
-        .pulse {
-            animation: pulse 1.5s infinite;
-        }
+    if standalone:
+        threading.Thread(target=run_prober, name="prober", daemon=True).start()
+        add_job(load_store_ips, "load_store_ips", minutes=30)
+        add_job(load_shift_statuses, "load_shift_statuses", seconds=10)
+        add_job(load_shop_activity, "load_shop_activity", seconds=30)
+    add_job(save_probe_state, "save_probe_state", seconds=CHECKPOINT_INTERVAL)
+    add_job(events.flush, "events_flush", seconds=events.FLUSH_INTERVAL)
+    add_job(
+        availability.flush, "availability_flush", seconds=availability.FLUSH_INTERVAL
+    )
+    add_job(
+        availability.prune, "availability_prune", seconds=availability.PRUNE_INTERVAL
+    )
+    scheduler.start()
+    profiling.register_jobs(scheduler)
+    atexit.register(save_probe_state)
+    atexit.register(events.flush)
+    atexit.register(availability.flush)
+    return scheduler
 
-        @keyframes pulse {
-            0% { box-shadow: 0 0 0 0 rgba(67, 97, 238, 0.4); }
-            70% { box-shadow: 0 0 0 10px rgba(67, 97, 238, 0); }
-            100% { box-shadow: 0 0 0 0 rgba(67, 97, 238, 0); }
-        }
 
-        @keyframes pulse-red {
-    0% { box-shadow: 0 0 0 0 rgba(249, 65, 68, 0.4); }
-    70% { box-shadow: 0 0 0 10px rgba(249, 65, 68, 0); }
-    100% { box-shadow: 0 0 0 0 rgba(249, 65, 68, 0); }
-}
-
-.pulse-red {
-    animation: pulse-red 1.5s infinite;
-}
-}
-
-.shift-status {
-    display: flex;
-    align-items: center;
-    gap: 8px;
-}
-
-.shift-status i {
-    font-size: 1.1rem;
-}
-
-.fa-door-open {
-    color: var(--success);
-}
-
-.fa-door-closed {
-    color: var(--danger);
-}
-
-.reset-btn {
-    width: 100%;
-    padding: 10px;
-    background-color: var(--primary);
-    color: white;
-    border: none;
-    border-radius: 6px;
-    cursor: pointer;
-    font-family: 'Roboto', sans-serif;
-    font-weight: 500;
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    gap: 8px;
-    margin-top: 10px;
-    transition:
-        background-color 0.4s ease,
-        color 0.4s ease,
-        transform 0.2s ease;
-    transform: scale(1);
-}
-
-.reset-btn:hover {
-    background-color: var(--primary-light);
-}
-
-.reset-btn:active {
-    transform: scale(0.97); /* эффект нажатия */
-}
-
-.reset-btn i {
-    font-size: 0.9rem;
-    transition: transform 0.3s ease;
-}
-
-.reset-btn.active {
-    background-color: var(--danger);
-    animation: pulse-red 0.75s;
-}
-
-.reset-btn.active i {
-    animation: spin 0.5s linear infinite;
-}
-
-@keyframes spin {
-    from { transform: rotate(0deg); }
-    to { transform: rotate(360deg); }
-}
-    </style>
+# Modern UI Template with Dark Mode
+html_template = """
+<!DOCTYPE html>
+<html lang="ru">
+<head>
+    <link rel="icon" href="{{ asset_url('img/favicon.png') }}" type="image/png">
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Мониторинг магазинов</title>
+    <link rel="preload" href="{{ asset_url('vendor/fontawesome/webfonts/fa-solid-900.woff2') }}" as="font" type="font/woff2" crossorigin>
+    <link rel="stylesheet" href="{{ asset_url('vendor/roboto/roboto.css') }}">
+    <link rel="stylesheet" href="{{ asset_url('vendor/fontawesome/css/fontawesome.min.css') }}">
+    <link rel="stylesheet" href="{{ asset_url('vendor/fontawesome/css/solid.min.css') }}">
+    <link rel="stylesheet" href="{{ asset_url('css/dashboard.css') }}">
+    <script src="{{ asset_url('js/theme.js') }}"></script>
 </head>
 <body>
     <header>
@@ -726,6 +590,12 @@ div[style*="overflow-y: auto"] {
 </div>
 
             <div class="main-content">
+                <!-- Закреплённый список: касса офлайн при открытой смене -->
+                <div id="priority-section" class="priority-section"{% if not priority_payload %} hidden{% endif %}>
+                    <h3><i class="fas fa-door-open"></i> Офлайн при открытой смене</h3>
+                    <ul id="priority-list"></ul>
+                </div>
+
                 <div class="table-header">
                     <h2><i class="fas fa-list"></i> Список магазинов</h2>
                 </div>
@@ -742,40 +612,10 @@ div[style*="overflow-y: auto"] {
 </table>
 
 <!-- Прокручиваемое тело таблицы -->
-<div style="max-height: 600px; overflow-y: auto;">
+<div id="stores-scroll" style="max-height: 600px; overflow-y: auto;">
     <table style="width: 100%; table-layout: fixed; border-collapse: collapse;">
-        <tbody id="stores-table">
-    {% for store, data in stores.items() %}
-    <tr id="{{ store }}" class="{{ data.status|lower }}" data-vpn="{{ data.vpn }}">
-        <td>
-            <strong>{{ store[4:] }}</strong><br>
-            <small>{{ data.ip }}</small>
-        </td>
-        <td>
-            <span class="status">
-                {% if data.status == 'Online' %}
-                    <i class="fas fa-circle"></i> Online
-                {% else %}
-                    <i class="fas fa-circle"></i> Offline
-                {% endif %}
-            </span>
-        </td>
-        <td>
-            <div class="router-status">
-                {% if data.router == 'Работает' %}
-                    <i class="fas fa-check-circle"></i>
-                {% elif data.router == 'Касса offline' %}
-                    <i class="fas fa-exclamation-circle"></i>
-                {% else %}
-                    <i class="fas fa-times-circle"></i>
-                {% endif %}
-                {{ data.router }}
-            </div>
-        </td>
-        <td class="last-updated">{{ data.last_updated }}</td>
-    </tr>
-    {% endfor %}
-</tbody>
+        <!-- Строки рисует dashboard.js: только видимые в окне прокрутки -->
+        <tbody id="stores-table"></tbody>
     </table>
 </div>
 
@@ -786,157 +626,10 @@ div[style*="overflow-y: auto"] {
         </div>
     </div>
 
-    <script src="https://cdnjs.cloudflare.com/ajax/libs/jquery/3.6.0/jquery.min.js"></script>
-    <script>
-        function fetchStatus() {
-    $.get('/status', function(data) {
-        // Обновляем статистику
-        const total = Object.keys(data).length;
-        const online = Object.values(data).filter(x => x.status === 'Online').length;
-
-        $('#total-stores').text(total + ' магазинов');
-        $('#online-stores').text(online + ' онлайн');
-        $('#offline-stores').text((total - online) + ' оффлайн');
-
-        // Обновляем таблицу
-        for (const [store, info] of Object.entries(data)) {
-            const row = $('#' + store);
-            if (row.length) {
-                // Обновляем класс строки
-                row.removeClass('online offline unknown').addClass(info.status.toLowerCase());
-
-                // Обновляем статус
-                const statusCell = row.find('td:nth-child(2) .status');
-                statusCell.html(info.status === 'Online' 
-                    ? '<i class="fas fa-circle"></i> Online' 
-                    : '<i class="fas fa-circle"></i> Offline');
-
-                // Обновляем статус роутера
-                const routerCell = row.find('td:nth-child(3) .router-status');
-                let icon = '';
-                if (info.router === 'Работает') {
-                    icon = '<i class="fas fa-check-circle"></i>';
-                } else if (info.router === 'Касса offline') {
-                    icon = '<i class="fas fa-exclamation-circle"></i>';
-                } else {
-                    icon = '<i class="fas fa-times-circle"></i>';
-                }
-                routerCell.html(icon + info.router);
-
-                // Обновляем время
-                row.find('td:nth-child(5)').text(info.last_updated);
-            }
-        }
-    });
-}
-
-        // Автоматическое обновление каждые 10 секунд
-        setInterval(fetchStatus, 10000);
-
-        // Ручное обновление по кнопке
-        $('#refresh-btn').click(function() {
-    const btn = $(this);
-
-    // Сохраняем исходные значения
-    const originalText = btn.html();
-    const originalColor = btn.css('background-color');
-
-    // Меняем стиль и текст
-    btn
-    .html('<i class="fas fa-sync-alt fa-spin"></i> Идёт обновление...')
-    .css('background-color', '#f94144')  // красный
-    .removeClass('pulse')
-    .addClass('pulse-red');
-
-
-    fetchStatus();
-
-    // Возврат через 2 секунды
-    setTimeout(() => {
-        btn
-            .html('<i class="fas fa-sync-alt"></i> Обновить')
-    .css('background-color', 'var(--primary)')
-    .removeClass('pulse-red')
-            .addClass('pulse'); // чтобы пульсация осталась
-    }, 2000);
-});
-
-        // Поиск и фильтрация
-        $('#status-filter, #vpn-filter').change(function() {
-    applyFilters();
-});
-
-function applyFilters() {
-    const status = $('#status-filter').val();
-    const vpn = $('#vpn-filter').val();
-    const search = $('#search-store').val().toLowerCase();
-
-    $('#stores-table tr').each(function() {
-        const row = $(this);
-        const rowStatus = row.hasClass('online') ? 'online' : 'offline';
-        const rowVpn = row.data('vpn') === 'Новая VPN' ? 'new' : 'old';
-
-        const statusMatch = status === 'all' || rowStatus === status;
-        const vpnMatch = vpn === 'all' || rowVpn === vpn;
-        const searchMatch = search === '' || row.attr('id').substring(4).includes(search);
-
-        // Плавное появление/исчезновение строк
-        if (statusMatch && vpnMatch && searchMatch) {
-            row.stop(true, true).fadeIn(200);
-        } else {
-            row.stop(true, true).fadeOut(200);
-        }
-    });
-}
-
-// Сброс фильтров
-$('#reset-filters').click(function() {
-    const btn = $(this);
-    const icon = btn.find('i');
-
-    // Убираем стандартную пульсацию
-    btn.removeClass('pulse');
-
-    // Добавляем активное состояние с pulse-red
-    btn.addClass('active pulse-red');
-
-    // Сбрасываем значения фильтров
-    $('#status-filter').val('all');
-    $('#vpn-filter').val('all');
-    $('#shift-filter').val('all');
-    $('#search-store').val('');
-
-    // Применяем фильтры
-    applyFilters();
-
-    // Возвращаем стандартный стиль через 0.75 секунды
-    setTimeout(() => {
-        btn.removeClass('active pulse-red');
-
-        // Возвращаем стандартную пульсацию после небольшой задержки
-        setTimeout(() => {
-            btn.addClass('pulse');
-        }, 200);
-
-    }, 750); // Уменьшенное время в 2 раза
-});
-
-// Инициализация - добавляем pulse эффект при загрузке
-$(document).ready(function() {
-    $('#reset-filters').addClass('pulse');
-    fetchStatus();
-});
-
-// Обновляем обработчик поиска
-$('#search-store').keyup(function() {
-    applyFilters();
-});
-
-        // Инициализация
-        $(document).ready(function() {
-            fetchStatus();
-        });
-    </script>
+    <script id="initial-status" type="application/json">{{ status_payload|tojson }}</script>
+    <script id="initial-priority" type="application/json">{{ priority_payload|tojson }}</script>
+    <script src="{{ asset_url('vendor/jquery/jquery.min.js') }}"></script>
+    <script src="{{ asset_url('js/dashboard.js') }}"></script>
 </body>
 </html>
 """
@@ -944,31 +637,322 @@ $('#search-store').keyup(function() {
 
 @app.route("/")
 def index():
-    online_count = sum(1 for data in stores.values() if data.get("status") == "Online")
-    offline_count = len(stores) - online_count
+    summary = counters.summary()
+    online_count = summary["online"]
+    offline_count = summary["total"] - online_count
 
     return render_template_string(
         html_template,
         stores=stores,
         online_count=online_count,
         offline_count=offline_count,
-        shift_statuses=shift_statuses,
-    )  # Добавляем передачу статусов смен
+        status_payload=status_payload(),
+        priority_payload=priority.view(),
+    )
+
+
+@app.route("/health")
+def health():
+    healthy = all(c["state"] == "running" for c in component_health.values())
+    return jsonify({"healthy": healthy, "components": component_health}), (
+        200 if healthy else 503
+    )
+
+
+def status_payload():
+    now = time.time()
+    return {
+        store: {
+            **data.to_dict(),
+            "shift": shift_statuses.get(store, {"is_shift_open": False}),
+            "activity": activity_payload(store, now),
+        }
+        for store, data in list(stores.items())
+    }
 
 
 @app.route("/status")
 def status():
+    return jsonify(status_payload())
+
+
+@app.route("/priority")
+def priority_view():
+    """Магазины офлайн при открытой смене, самый долгий простой первым."""
+    return jsonify(priority.view())
+
+
+@app.route("/summary")
+def summary():
+    """Счётчики по статусам: всего и по VPN, подсетям, открытым сменам."""
+    return jsonify(counters.summary())
+
+
+def parse_period(args, default_days=1):
+    """Период из ?from= и ?to= (YYYY-MM-DD[THH:MM]), по умолчанию последние сутки."""
+    try:
+        end = datetime.fromisoformat(args["to"]).timestamp() if "to" in args else time.time()
+        start = (
+            datetime.fromisoformat(args["from"]).timestamp()
+            if "from" in args
+            else end - default_days * 86400
+        )
+    except ValueError:
+        abort(400, "from и to в формате YYYY-MM-DD[THH:MM]")
+    if start >= end:
+        abort(400, "from должен быть раньше to")
+    return start, end
+
+
+@app.route("/topology")
+def topology_status():
+    """Состояние узлов связи из карты сети."""
+    return jsonify(topology.snapshot())
+
+
+@app.route("/sla")
+def sla():
+    """Доступность магазинов за период: ?from=&to=&store=."""
+    start, end = parse_period(request.args)
+    tier, totals = availability.sla(start, end, request.args.get("store"))
     return jsonify(
         {
-            store: {
-                **data,
-                "vpn": data["vpn"],
-                "shift": shift_statuses.get(store, {"is_shift_open": False}),
-            }
-            for store, data in stores.items()
+            "from": datetime.fromtimestamp(start).isoformat(timespec="seconds"),
+            "to": datetime.fromtimestamp(end).isoformat(timespec="seconds"),
+            "tier": tier,
+            "stores": totals,
+        }
+    )
+
+
+@app.route("/sla/<store>")
+def sla_series(store):
+    """Доступность магазина по интервалам: ?from=&to=&tier=1m|1h|1d."""
+    start, end = parse_period(request.args)
+    tier = None
+    if "tier" in request.args:
+        try:
+            tier = availability.tier_by_name(request.args["tier"])
+        except KeyError:
+            abort(400, "tier: 1m, 1h или 1d")
+    tier_name, rows = availability.query(start, end, store, tier)
+    return jsonify(
+        {
+            "store": store,
+            "tier": tier_name,
+            "buckets": [
+                {
+                    "start": datetime.fromtimestamp(row["bucket"]).isoformat(
+                        timespec="seconds"
+                    ),
+                    "online": row["online"],
+                    "offline": row["offline"],
+                    "unknown": row["unknown"],
+                }
+                for row in rows
+            ],
         }
     )
 
 
+@app.route("/shifts/history")
+def shifts_history():
+    """История смен за период: ?from=YYYY-MM-DD&to=YYYY-MM-DD&shop=12"""
+    return jsonify(list(shift_history.query_range(*parse_shift_range(request.args))))
+
+
+def parse_shift_range(args):
+    """(с, по, магазин) из ?from=, ?to= и ?shop= для истории смен."""
+    today = datetime.now().date().isoformat()
+    date_from = args.get("from", today)
+    date_to = args.get("to", date_from)
+    shop = args.get("shop")
+    try:
+        datetime.strptime(date_from, "%Y-%m-%d")
+        datetime.strptime(date_to, "%Y-%m-%d")
+    except ValueError:
+        abort(400, "Даты в формате YYYY-MM-DD")
+    if shop and not shop.startswith("shop"):
+        shop = f"shop{shop}"
+    return date_from, date_to, shop
+
+
+def store_matches(store, data, args):
+    """Фильтры выгрузки: status=online|offline|unknown, vpn=new|old,
+    shop=часть номера, shift=open|closed."""
+    status = args.get("status")
+    if status and data.status.name.lower() != status:
+        return False
+    vpn = args.get("vpn")
+    if vpn and (data.vpn == "Новая VPN") != (vpn == "new"):
+        return False
+    shop = args.get("shop")
+    if shop and shop not in store[4:]:
+        return False
+    shift = args.get("shift")
+    if shift:
+        is_open = shift_statuses.get(store, {}).get("is_shift_open", False)
+        if is_open != (shift == "open"):
+            return False
+    return True
+
+
+EXPORT_STATUS_FIELDS = [
+    "store",
+    "ip",
+    "vpn",
+    "status",
+    "router",
+    "last_updated",
+    "changed_at",
+    "stale",
+    "shift_open",
+    "cashiers",
+]
+
+
+@app.route("/export/status.<fmt>")
+def export_status(fmt):
+    args = request.args.to_dict()
+
+    def rows():
+        for store, data in list(stores.items()):
+            if not store_matches(store, data, args):
+                continue
+            shift = shift_statuses.get(store, {})
+            yield {
+                **data.to_dict(),
+                "store": store,
+                "shift_open": shift.get("is_shift_open", False),
+                "cashiers": ", ".join(
+                    c["user_name"] for c in shift.get("cashiers", [])
+                ),
+            }
+
+    return export.stream(rows(), EXPORT_STATUS_FIELDS, fmt, "status")
+
+
+@app.route("/export/history.<fmt>")
+def export_history(fmt):
+    """Смены статусов магазинов, ?since=YYYY-MM-DD[THH:MM] и фильтры status."""
+    args = request.args.to_dict()
+    since = args.pop("since", None)
+    try:
+        since_ts = datetime.fromisoformat(since).timestamp() if since else 0
+    except ValueError:
+        abort(400, "since в формате YYYY-MM-DD[THH:MM]")
+
+    def rows():
+        for store, data in list(stores.items()):
+            if not store_matches(store, data, args):
+                continue
+            for ts, status, router in list(store_history.get(store, ())):
+                if ts < since_ts:
+                    continue
+                yield {
+                    "store": store,
+                    "time": datetime.fromtimestamp(ts).isoformat(),
+                    "status": STATUS_LABELS[status],
+                    "router": ROUTER_LABELS[router],
+                }
+
+    return export.stream(rows(), ["store", "time", "status", "router"], fmt, "history")
+
+
+@app.route("/export/shifts.<fmt>")
+def export_shifts(fmt):
+    """Итоги смен за период, параметры как у /shifts/history."""
+    date_from, date_to, shop = parse_shift_range(request.args)
+
+    def rows():
+        for row in shift_history.query_range(date_from, date_to, shop):
+            row["cashiers"] = ", ".join(c["user_name"] for c in row["cashiers"])
+            yield row
+
+    return export.stream(
+        rows(), ["day", "shop", "first_tx", "tx_count", "cashiers"], fmt, "shifts"
+    )
+
+
+@app.route("/diagnostics/<store>", methods=["GET", "POST"])
+def store_diagnostics(store):
+    """POST запускает потери пингов и трассировку для магазина (или
+    присоединяется к уже идущей), GET отдаёт последний результат."""
+    data = stores.get(store)
+    if data is None:
+        abort(404, f"Нет магазина {store}")
+
+    if request.method == "POST":
+        try:
+            job = diagnostics.submit(store, data.ip, data.vpn)
+        except diagnostics.DiagnosticsBusy:
+            abort(429, "Слишком много диагностик одновременно, повторите позже")
+        return jsonify(job), 202 if job["state"] == "running" else 200
+
+    job = diagnostics.status(store)
+    if job is None:
+        abort(404, "Диагностика магазина не запускалась")
+    return jsonify(job)
+
+
+@app.route("/admin/profile")
+def admin_profile():
+    """Профиль цели за ?seconds=, режим ?mode=deterministic|sampling.
+
+    Без ?target= возвращает список доступных целей."""
+    target = request.args.get("target")
+    if not target:
+        return jsonify({"targets": profiling.targets()})
+    try:
+        result = profiling.capture(
+            target,
+            request.args.get("seconds", 10),
+            request.args.get("mode", "deterministic"),
+            int(request.args.get("limit", profiling.TOP_LIMIT)),
+        )
+    except KeyError:
+        abort(404, f"Нет цели {target}")
+    except ValueError:
+        abort(400, "mode: deterministic или sampling; seconds и limit — числа")
+    except profiling.CaptureBusy:
+        abort(409, "Уже идёт другой замер")
+    return jsonify(result)
+
+
+@app.route("/admin/slow-runs")
+def admin_slow_runs():
+    return jsonify(profiling.slow_runs())
+
+
+def set_check_store(func):
+    global check_store
+    check_store = func
+
+
+profiling.register_routes(app)
+profiling.register_target("probe:check_store", lambda: check_store, set_check_store)
+
+
+def warm_start(standalone=True):
+    """Загружает сохранённые данные и запускает опрос.
+
+    Выполняется в фоне, когда HTTP-сервер уже принимает запросы.
+    """
+    recording.start_from_env()
+    load_store_ips()
+    startup_trace.mark("stores")
+    load_probe_state()
+    load_shift_statuses()
+    load_shop_activity()
+    assets.ensure_built()
+    startup_trace.mark("assets")
+    start_scheduler(standalone)
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=80)
+    startup_trace.mark("imports")
+    # Страница отвечает сразу, список магазинов и опрос поднимаются в фоне
+    threading.Thread(target=warm_start, name="warm-start", daemon=True).start()
+    server = make_server(HOST, PORT, app, threaded=True)
+    startup_trace.mark("http")
+    server.serve_forever()
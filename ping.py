@@ -1,6 +1,11 @@
+import startup_trace
+
+startup_trace.mark("interpreter")
+
 import os
 import re
 import subprocess
+import threading
 import time
 import json
 from datetime import datetime
@@ -8,6 +13,19 @@ from datetime import datetime
 # Путь к JSON файлу
 SHOP_LIST_JSON = "shop_list.json"
 
+# Период обновления адресов, сек
+RESOLVE_INTERVAL = 3600
+
+# Период сверки списка магазинов с poscard_settings, сек
+INVENTORY_INTERVAL = 600
+# Сверка не удаляет за раз больше этой доли списка: скорее всего,
+# база вернула неполные данные. Короткий список так не защищается
+INVENTORY_MAX_REMOVE_SHARE = 0.5
+INVENTORY_GUARD_MIN_SHOPS = 10
+
+# Файл списка меняют и полное обновление адресов, и сверка
+_shops_lock = threading.Lock()
+
 
 def ping_shop(shop_name):
     try:
@@ -54,11 +72,16 @@ def save_shops(shops):
 
 
 def update_shop_list():
+    with _shops_lock:
+        return _update_shop_list()
+
+
+def _update_shop_list():
     shops = load_shops()
 
-    # Если файл пустой, можно загрузить начальные данные (опционально)
+    # Пустой список заполнит сверка с poscard_settings
     if not shops:
-        shops = [{"name": "shop123", "ip": "192.168.1.1", "vpn": "Новая VPN"}]  # Пример
+        return []
 
     updated_shops = []
 
@@ -86,23 +109,116 @@ def update_shop_list():
             vpn_status = old_vpn
 
         updated_shops.append(
-            {
-                "name": shop_name,
-                "ip": current_ip,
-                "vpn": vpn_status,
-                "last_checked": datetime.now().isoformat(),  # Доп. поле для логов
-            }
+            with_backup(
+                {
+                    "name": shop_name,
+                    "ip": current_ip,
+                    "vpn": vpn_status,
+                    "last_checked": datetime.now().isoformat(),  # Доп. поле для логов
+                },
+                shop,
+            )
         )
 
     save_shops(updated_shops)
     print(f"✅ Данные обновлены: {datetime.now()}")
+    return updated_shops
+
+
+def resolve_shop(shop_name, old=None):
+    """Запись списка для магазина: адрес по имени, при неудаче — прежний."""
+    shop_num_match = re.search(r"shop(\d+)", shop_name)
+    current_ip = ping_shop(shop_name)
+    if current_ip and shop_num_match:
+        vpn_status = determine_vpn(current_ip, shop_num_match.group(1))
+    elif current_ip:
+        vpn_status = "Старая VPN"
+    elif old:
+        current_ip, vpn_status = old["ip"], old["vpn"]
+    else:
+        vpn_status = determine_vpn(None, None)
+
+    return with_backup(
+        {
+            "name": shop_name,
+            "ip": current_ip,
+            "vpn": vpn_status,
+            "last_checked": datetime.now().isoformat(),
+        },
+        old,
+    )
+
+
+def with_backup(entry, old):
+    """Переносит в новую запись резервные каналы ("backup"), заданные в списке.
+
+    Резервные адреса задаются только вручную; прежний адрес магазина
+    резервным не становится, иначе отключённый канал опрашивался бы вечно.
+    """
+    backup = [
+        path for path in (old or {}).get("backup", []) if path["ip"] != entry["ip"]
+    ]
+    if backup:
+        entry["backup"] = backup
+    return entry
+
+
+def sync_inventory(shop_names):
+    """Сверяет список магазинов с набором имён из базы.
+
+    Разрешает адреса только новых магазинов и тех, у кого адреса ещё нет,
+    остальные записи не трогает. Возвращает (добавленные или изменённые
+    записи, имена удалённых магазинов).
+    """
+    with _shops_lock:
+        shops = load_shops()
+        by_name = {shop["name"]: shop for shop in shops}
+
+        removed = [name for name in by_name if name not in shop_names]
+        if (
+            removed
+            and len(by_name) >= INVENTORY_GUARD_MIN_SHOPS
+            and len(removed) > len(by_name) * INVENTORY_MAX_REMOVE_SHARE
+        ):
+            print(
+                f"⚠️ Сверка хочет удалить {len(removed)} из {len(by_name)} "
+                f"магазинов, удаление пропущено"
+            )
+            removed = []
+
+        changed = []
+        for name in sorted(shop_names):
+            old = by_name.get(name)
+            if old is not None and old.get("ip"):
+                continue
+            entry = resolve_shop(name, old)
+            if entry["ip"] is None:
+                # Адрес не найден: новый магазин в список не попадает,
+                # у прежней записи всё остаётся как есть; повтор на следующей сверке
+                continue
+            by_name[name] = entry
+            changed.append(entry)
+
+        if not changed and not removed:
+            return [], []
+
+        for name in removed:
+            del by_name[name]
+        save_shops(list(by_name.values()))
+
+    print(
+        f"✅ Сверка списка магазинов: +{len(changed)} / -{len(removed)} "
+        f"({datetime.now()})"
+    )
+    return changed, removed
 
 
 def main():
     while True:
         update_shop_list()
-        time.sleep(3600)  # Проверка раз в час
+        time.sleep(RESOLVE_INTERVAL)  # Проверка раз в час
 
 
 if __name__ == "__main__":
+    startup_trace.mark("imports")
     main()
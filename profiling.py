@@ -0,0 +1,264 @@
+import cProfile
+import functools
+import heapq
+import itertools
+import os
+import pstats
+import sys
+import threading
+import time
+from datetime import datetime
+
+# Профилирование по запросу: на время замера функция цели (задача
+# планировщика, обработчик маршрута, проверка магазина) подменяется
+# обёрткой, а после замера возвращается исходная. Пока замер не идёт,
+# никаких обёрток нет и накладных расходов тоже.
+
+MAX_CAPTURE_SECONDS = 60
+SAMPLE_INTERVAL = 0.005  # сек между снимками стеков в режиме sampling
+TOP_LIMIT = 30
+
+# Самые долгие запуски задач
+SLOW_RUNS_LIMIT = 20
+
+_targets = {}  # имя -> (получить функцию, установить функцию)
+_capture_lock = threading.Lock()
+
+_slow_runs = []  # куча (длительность, №, задача, начало)
+_slow_runs_lock = threading.Lock()
+_run_counter = itertools.count()
+
+
+class CaptureBusy(Exception):
+    pass
+
+
+def register_target(name, get, set_):
+    _targets[name] = (get, set_)
+
+
+def register_routes(app, skip=("static", "assets")):
+    for endpoint in list(app.view_functions):
+        if endpoint in skip:
+            continue
+        register_target(
+            f"route:{endpoint}",
+            lambda e=endpoint: app.view_functions[e],
+            lambda func, e=endpoint: app.view_functions.__setitem__(e, func),
+        )
+
+
+def register_jobs(scheduler):
+    for job in scheduler.get_jobs():
+        register_target(
+            f"job:{job.id}",
+            lambda j=job.id: scheduler.get_job(j).func,
+            lambda func, j=job.id: scheduler.modify_job(j, func=func),
+        )
+
+
+def targets():
+    return sorted(_targets)
+
+
+def timed(name, func):
+    """Обёртка задачи, запоминающая самые долгие запуски."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.time()
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            record_run(name, time.perf_counter() - t0, started)
+
+    return wrapper
+
+
+def record_run(name, duration, started):
+    entry = (duration, next(_run_counter), name, started)
+    with _slow_runs_lock:
+        if len(_slow_runs) < SLOW_RUNS_LIMIT:
+            heapq.heappush(_slow_runs, entry)
+        elif duration > _slow_runs[0][0]:
+            heapq.heapreplace(_slow_runs, entry)
+
+
+def slow_runs():
+    with _slow_runs_lock:
+        entries = sorted(_slow_runs, reverse=True)
+    return [
+        {
+            "job": name,
+            "duration": round(duration, 4),
+            "started": datetime.fromtimestamp(started).isoformat(timespec="seconds"),
+        }
+        for duration, _, name, started in entries
+    ]
+
+
+def _short_path(filename):
+    try:
+        return os.path.relpath(filename)
+    except ValueError:
+        return filename
+
+
+def _deterministic(func, state):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # В Python 3.12+ одновременно может работать только один
+            # профилировщик; параллельный вызов считаем без профиля
+            profiler = None
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            elapsed = time.perf_counter() - t0
+            if profiler is not None:
+                profiler.disable()
+            with state["lock"]:
+                state["calls"] += 1
+                state["total"] += elapsed
+                if profiler is not None:
+                    state["profiles"].append(profiler)
+
+    return wrapper
+
+
+def _sampling(func, state):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        ident = threading.get_ident()
+        t0 = time.perf_counter()
+        state["active"][ident] = state["active"].get(ident, 0) + 1
+        try:
+            return func(*args, **kwargs)
+        finally:
+            depth = state["active"][ident] - 1
+            if depth:
+                state["active"][ident] = depth
+            else:
+                del state["active"][ident]
+            with state["lock"]:
+                state["calls"] += 1
+                state["total"] += time.perf_counter() - t0
+
+    return wrapper
+
+
+def _sampler(state, stop):
+    stacks = state["stacks"]
+    while not stop.wait(SAMPLE_INTERVAL):
+        frames = sys._current_frames()
+        for ident in list(state["active"]):
+            frame = frames.get(ident)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{_short_path(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            if stack:
+                key = ";".join(reversed(stack))
+                stacks[key] = stacks.get(key, 0) + 1
+        state["samples"] += 1
+
+
+def _deterministic_report(state, limit):
+    if not state["profiles"]:
+        return []
+    stats = pstats.Stats(state["profiles"][0])
+    for profiler in state["profiles"][1:]:
+        stats.add(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    return [
+        {
+            "function": f"{_short_path(filename)}:{line}({name})",
+            "calls": nc,
+            "tottime": round(tt, 6),
+            "cumtime": round(ct, 6),
+        }
+        for (filename, line, name), (cc, nc, tt, ct, callers) in rows[:limit]
+    ]
+
+
+def _sampling_report(state, limit):
+    stacks = sorted(state["stacks"].items(), key=lambda item: item[1], reverse=True)
+    own = {}
+    for stack, count in stacks:
+        leaf = stack.rsplit(";", 1)[-1]
+        own[leaf] = own.get(leaf, 0) + count
+    return {
+        "samples": state["samples"],
+        "interval": SAMPLE_INTERVAL,
+        "functions": [
+            {"function": name, "samples": count}
+            for name, count in sorted(own.items(), key=lambda i: i[1], reverse=True)[
+                :limit
+            ]
+        ],
+        "stacks": [{"stack": stack, "samples": count} for stack, count in stacks[:limit]],
+    }
+
+
+def capture(target, seconds, mode="deterministic", limit=TOP_LIMIT):
+    """Профилирует цель seconds секунд и возвращает сводную статистику."""
+    if target not in _targets:
+        raise KeyError(target)
+    if mode not in ("deterministic", "sampling"):
+        raise ValueError(mode)
+    seconds = max(0.1, min(float(seconds), MAX_CAPTURE_SECONDS))
+
+    if not _capture_lock.acquire(blocking=False):
+        raise CaptureBusy()
+    try:
+        get, set_ = _targets[target]
+        original = get()
+        state = {
+            "lock": threading.Lock(),
+            "calls": 0,
+            "total": 0.0,
+            "profiles": [],
+            "active": {},
+            "stacks": {},
+            "samples": 0,
+        }
+        stop = threading.Event()
+        sampler = None
+        if mode == "sampling":
+            sampler = threading.Thread(
+                target=_sampler, args=(state, stop), name="profiler", daemon=True
+            )
+            sampler.start()
+            set_(_sampling(original, state))
+        else:
+            set_(_deterministic(original, state))
+
+        try:
+            time.sleep(seconds)
+        finally:
+            set_(original)
+            stop.set()
+            if sampler is not None:
+                sampler.join()
+
+        with state["lock"]:
+            result = {
+                "target": target,
+                "mode": mode,
+                "seconds": seconds,
+                "calls": state["calls"],
+                "total_time": round(state["total"], 6),
+            }
+            if mode == "sampling":
+                result.update(_sampling_report(state, limit))
+            else:
+                result["functions"] = _deterministic_report(state, limit)
+        return result
+    finally:
+        _capture_lock.release()
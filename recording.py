@@ -0,0 +1,154 @@
+import atexit
+import json
+import logging
+import os
+import struct
+import threading
+import time
+import zlib
+
+# Запись входных потоков для воспроизведения (replay.py): результаты опроса
+# магазинов и отчёты о сменах с временем получения. Включается переменной
+# окружения MAG_SERV_RECORD=<файл>. main.py пишет в сам файл, shift_watcher.py,
+# запущенный отдельно, — в <файл>.shifts; в режиме start.py оба потока
+# попадают в один файл.
+#
+# Формат: MAGIC, затем записи "<Bd" (тип, epoch) и тело по типу:
+#   STORE  — "<IH" (номер, длина) + JSON {"name", "ip", "vpn", "backup"}:
+#            магазин получает номер при первом опросе и при смене адресов;
+#   PROBE  — "<IBBB" номер магазина, Status, Router, канал ответа
+#            (0 — основной адрес, 1.. — резервные, NO_PATH — не ответил);
+#   SHIFTS — "<I" длина + отчёт shift_watcher в JSON, сжатый zlib.
+MAGIC = b"MAGREC1\n"
+
+STORE, PROBE, SHIFTS = 0, 1, 2
+NO_PATH = 255
+
+HEAD = struct.Struct("<Bd")
+STORE_BODY = struct.Struct("<IH")
+PROBE_BODY = struct.Struct("<IBBB")
+SHIFTS_BODY = struct.Struct("<I")
+
+FLUSH_INTERVAL = 5  # сек между сбросами буфера на диск
+
+_lock = threading.Lock()
+_file = None
+_stores = {}  # магазин -> (номер, адреса на момент записи)
+_last_flush = 0
+
+
+def start_from_env(suffix=""):
+    path = os.environ.get("MAG_SERV_RECORD")
+    if path:
+        start(path + suffix)
+
+
+def start(path):
+    """Начинает запись в новый файл (существующий перезаписывается)."""
+    global _file
+    with _lock:
+        if _file is not None:
+            return
+        _file = open(path, "wb")
+        _file.write(MAGIC)
+        _stores.clear()
+    atexit.register(stop)
+    logging.info(f"Запись входных данных в {path}")
+
+
+def stop():
+    global _file
+    with _lock:
+        if _file is not None:
+            _file.close()
+            _file = None
+
+
+def _write(chunks):
+    global _last_flush
+    _file.write(b"".join(chunks))
+    now = time.monotonic()
+    if now - _last_flush >= FLUSH_INTERVAL:
+        _file.flush()
+        _last_flush = now
+
+
+def probe(store, data, status, router, via, ts=None):
+    """Записывает результат опроса; data — StoreRecord магазина."""
+    if _file is None:
+        return
+    ts = time.time() if ts is None else ts
+    paths = (data.ip, *(ip for ip, _ in data.backup))
+    with _lock:
+        if _file is None:
+            return
+        chunks = []
+        known = _stores.get(store)
+        if known is None or known[1] != (paths, data.vpn, data.backup):
+            number = len(_stores) if known is None else known[0]
+            _stores[store] = (number, (paths, data.vpn, data.backup))
+            body = json.dumps(
+                {
+                    "name": store,
+                    "ip": data.ip,
+                    "vpn": data.vpn,
+                    "backup": [{"ip": ip, "vpn": vpn} for ip, vpn in data.backup],
+                },
+                ensure_ascii=False,
+            ).encode("utf-8")
+            chunks += [HEAD.pack(STORE, ts), STORE_BODY.pack(number, len(body)), body]
+        else:
+            number = known[0]
+        path = paths.index(via) if via in paths else NO_PATH
+        chunks += [HEAD.pack(PROBE, ts), PROBE_BODY.pack(number, status, router, path)]
+        _write(chunks)
+
+
+def shifts(report, ts=None):
+    """Записывает отчёт о сменах {магазин: {"is_shift_open", "cashiers"}}."""
+    if _file is None:
+        return
+    ts = time.time() if ts is None else ts
+    body = zlib.compress(json.dumps(report, ensure_ascii=False).encode("utf-8"))
+    with _lock:
+        if _file is not None:
+            _write([HEAD.pack(SHIFTS, ts), SHIFTS_BODY.pack(len(body)), body])
+
+
+def read(path):
+    """Записи файла по порядку: (epoch, тип, данные).
+
+    STORE — словарь магазина, PROBE — (магазин, Status, Router, канал),
+    SHIFTS — отчёт. Оборванная последняя запись пропускается.
+    """
+    names = {}
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path}: не файл записи")
+
+        def take(size):
+            chunk = f.read(size)
+            if len(chunk) < size:
+                raise EOFError
+            return chunk
+
+        try:
+            while True:
+                kind, ts = HEAD.unpack(take(HEAD.size))
+                if kind == PROBE:
+                    number, status, router, path_index = PROBE_BODY.unpack(
+                        take(PROBE_BODY.size)
+                    )
+                    yield ts, PROBE, (names[number], status, router, path_index)
+                elif kind == STORE:
+                    number, size = STORE_BODY.unpack(take(STORE_BODY.size))
+                    shop = json.loads(take(size).decode("utf-8"))
+                    names[number] = shop["name"]
+                    yield ts, STORE, shop
+                elif kind == SHIFTS:
+                    (size,) = SHIFTS_BODY.unpack(take(SHIFTS_BODY.size))
+                    yield ts, SHIFTS, json.loads(zlib.decompress(take(size)))
+                else:
+                    raise ValueError(f"{path}: неизвестный тип записи {kind}")
+        except EOFError:
+            return
@@ -0,0 +1,108 @@
+import argparse
+import heapq
+import logging
+import sys
+import threading
+import time
+
+from werkzeug.serving import make_server
+
+import assets
+import main
+import recording
+from store_state import Router, Status
+
+# Воспроизведение записи входных потоков (recording.py) без сети и базы:
+# результаты опроса и отчёты о сменах подаются в main.py в записанном
+# порядке и темпе, умноженном на --speed, а веб-интерфейс работает как
+# обычно. Время состояния магазинов — время воспроизведения, а не записи.
+#
+#   python replay.py outage.rec outage.rec.shifts --speed 10 --port 8080
+#   python replay.py outage.rec --speed 0 --no-http   # как можно быстрее
+#
+# В конце печатается число записей, время и наибольшее отставание
+# от расписания: если оно растёт, конвейер состояния не успевает.
+
+REPORT_INTERVAL = 10  # сек между строками хода воспроизведения
+
+
+def merged(paths):
+    return heapq.merge(*(recording.read(path) for path in paths), key=lambda r: r[0])
+
+
+def apply(kind, data):
+    if kind == recording.STORE:
+        main.upsert_stores([data])
+    elif kind == recording.PROBE:
+        store, status, router, path = data
+        record = main.stores.get(store)
+        if record is None:
+            return
+        paths = (record.ip, *(ip for ip, _ in record.backup))
+        via = paths[path] if path < len(paths) else None
+        main.update_store_state(store, Status(status), Router(router), via)
+    elif kind == recording.SHIFTS:
+        main.ingest_shift_report(data)
+
+
+def replay(paths, speed):
+    """Подаёт записи; speed=0 — без пауз. Возвращает (записей, сек, отставание)."""
+    count = 0
+    max_lag = 0
+    first_ts = None
+    started = last_report = time.monotonic()
+    for ts, kind, data in merged(paths):
+        if first_ts is None:
+            first_ts = ts
+        now = time.monotonic()
+        if speed:
+            due = started + (ts - first_ts) / speed
+            if due > now:
+                time.sleep(due - now)
+            else:
+                max_lag = max(max_lag, now - due)
+        apply(kind, data)
+        count += 1
+        if now - last_report >= REPORT_INTERVAL:
+            last_report = now
+            logging.info(
+                f"Воспроизведено {count} записей, запись на "
+                f"{time.strftime('%H:%M:%S', time.localtime(ts))}"
+            )
+    return count, time.monotonic() - started, max_lag
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Воспроизведение записи опроса и смен")
+    parser.add_argument("paths", nargs="+", help="файлы записи, сливаются по времени")
+    parser.add_argument(
+        "--speed", type=float, default=1, help="ускорение, 0 — как можно быстрее"
+    )
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--no-http", action="store_true", help="без веб-интерфейса")
+    parser.add_argument(
+        "--hold", action="store_true", help="не выходить после конца записи"
+    )
+    args = parser.parse_args()
+
+    if not args.no_http:
+        assets.ensure_built()
+        server = make_server(main.HOST, args.port, main.app, threaded=True)
+        threading.Thread(target=server.serve_forever, name="http", daemon=True).start()
+        logging.info(f"Веб-интерфейс: http://127.0.0.1:{args.port}/")
+
+    count, elapsed, max_lag = replay(args.paths, args.speed)
+    print(
+        f"Воспроизведено {count} записей за {elapsed:.1f} сек "
+        f"({count / elapsed if elapsed else 0:.0f}/сек), "
+        f"наибольшее отставание {max_lag:.3f} сек"
+    )
+    if args.hold and not args.no_http:
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
@@ -0,0 +1,85 @@
+import json
+import os
+import sqlite3
+
+# Дневные итоги по сменам: shift_watcher дописывает их в течение дня,
+# main.py отвечает на запросы за период, не обращаясь к базе документов
+SHIFT_HISTORY_PATH = r"shift_history.db"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS shift_rollup (
+    day TEXT NOT NULL,
+    shop TEXT NOT NULL,
+    first_tx TEXT,
+    tx_count INTEGER NOT NULL,
+    cashiers TEXT NOT NULL,
+    PRIMARY KEY (day, shop)
+)
+"""
+
+
+def connect(path=SHIFT_HISTORY_PATH, readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, timeout=5)
+    else:
+        conn = sqlite3.connect(path, timeout=5)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(SCHEMA)
+    return conn
+
+
+def upsert_rollups(day, rollups, path=SHIFT_HISTORY_PATH):
+    """Записывает итоги дня по магазинам: {shop: {first_tx, tx_count, cashiers}}."""
+    if not rollups:
+        return
+    conn = connect(path)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT INTO shift_rollup (day, shop, first_tx, tx_count, cashiers) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (day, shop) DO UPDATE SET "
+                "first_tx = excluded.first_tx, tx_count = excluded.tx_count, "
+                "cashiers = excluded.cashiers",
+                [
+                    (
+                        day,
+                        shop,
+                        data["first_tx"],
+                        data["tx_count"],
+                        json.dumps(data["cashiers"], ensure_ascii=False),
+                    )
+                    for shop, data in rollups.items()
+                ],
+            )
+    finally:
+        conn.close()
+
+
+def query_range(date_from, date_to, shop=None, path=SHIFT_HISTORY_PATH):
+    """Итоги за период [date_from, date_to] (строки YYYY-MM-DD), по дням."""
+    if not os.path.exists(path):
+        return
+
+    sql = (
+        "SELECT day, shop, first_tx, tx_count, cashiers FROM shift_rollup "
+        "WHERE day BETWEEN ? AND ?"
+    )
+    params = [date_from, date_to]
+    if shop:
+        sql += " AND shop = ?"
+        params.append(shop)
+    sql += " ORDER BY day, shop"
+
+    conn = connect(path, readonly=True)
+    try:
+        for day, shop_name, first_tx, tx_count, cashiers in conn.execute(sql, params):
+            yield {
+                "day": day,
+                "shop": shop_name,
+                "first_tx": first_tx,
+                "tx_count": tx_count,
+                "cashiers": json.loads(cashiers),
+            }
+    finally:
+        conn.close()
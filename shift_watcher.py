@@ -1,23 +1,78 @@
-import psycopg2
 import json
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+from atomic_file import dump_compact, content_hash, file_hash, write_atomic
+import recording
+import shift_history
+from datetime import datetime, timedelta
+import os
+import select
 import sys
+import threading
 import time
 
+# Параметры подключения можно переопределить через окружение,
+# например чтобы проверить режим LISTEN на локальном PostgreSQL
 DB_CONFIG = {
-    "host": "192.168.0.200",
-    "port": 5438,
-    "user": "postgres",
-    "password": "user",
-    "main_db": "main",
-    "docs_db": "docs",
+    "host": os.environ.get("SHIFT_DB_HOST", "192.168.0.200"),
+    "port": int(os.environ.get("SHIFT_DB_PORT", 5438)),
+    "user": os.environ.get("SHIFT_DB_USER", "postgres"),
+    "password": os.environ.get("SHIFT_DB_PASSWORD", "user"),
+    "main_db": os.environ.get("SHIFT_DB_MAIN", "main"),
+    "docs_db": os.environ.get("SHIFT_DB_DOCS", "docs"),
 }
 
 EXCLUDED_SHOPS = {"1", "97"}
 STATIC_POSCODES = {"1": "700123", "1z": "2001", "97": "2097"}
 
+# Интервал опроса в обычном режиме
+POLL_INTERVAL = 10
+
+# Ограничения по времени: подключение, один запрос на сервере и весь
+# этап выборки (четыре запроса идут параллельно)
+CONNECT_TIMEOUT = 3  # сек
+STATEMENT_TIMEOUT_MS = 5000
+FETCH_DEADLINE = 8  # сек
+
+# Справочники poscard_settings и user_entity кэшируются в памяти и
+# перечитываются только при смене отпечатка, но не реже раза в REF_CACHE_TTL
+REF_CACHE_TTL = 3600  # сек
+_ref_cache = {}  # таблица -> {"fingerprint", "data", "loaded_at"}
+
+# Режим LISTEN/NOTIFY: триггер на doctransaction_entity шлёт уведомление
+# на каждую вставку с tranztype 62/64, а полный опрос остаётся страховкой
+SHIFT_TRANZTYPES = (62, 64)
+NOTIFY_CHANNEL = "mag_serv_shift_tx"
+NOTIFY_TRIGGER = "mag_serv_shift_tx"
+RECONCILE_INTERVAL = 300  # сек между сверочными опросами
+
+NOTIFY_TRIGGER_SQL = f"""
+CREATE OR REPLACE FUNCTION {NOTIFY_TRIGGER}_notify() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{NOTIFY_CHANNEL}', json_build_object(
+        'unitcode', NEW.unitcode,
+        'seller', NEW.seller,
+        'tranztype', NEW.tranztype,
+        'tranzdate', NEW.tranzdate,
+        'txid', txid_current(),
+        -- одинаковые уведомления одной транзакции PostgreSQL склеивает
+        'at', clock_timestamp()
+    )::text);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS {NOTIFY_TRIGGER} ON doctransaction_entity;
+CREATE TRIGGER {NOTIFY_TRIGGER}
+    AFTER INSERT ON doctransaction_entity
+    FOR EACH ROW WHEN (NEW.tranztype IN {SHIFT_TRANZTYPES})
+    EXECUTE PROCEDURE {NOTIFY_TRIGGER}_notify();
+"""
+
 
 def connect_to_db(dbname):
+    # psycopg2 импортируется при первом подключении, а не при запуске
+    import psycopg2
+
     try:
         return psycopg2.connect(
             host=DB_CONFIG["host"],
@@ -25,6 +80,13 @@ def connect_to_db(dbname):
             user=DB_CONFIG["user"],
             password=DB_CONFIG["password"],
             database=dbname,
+            connect_timeout=CONNECT_TIMEOUT,
+            options=f"-c statement_timeout={STATEMENT_TIMEOUT_MS}",
+            # Обрыв сети не должен подвешивать чтение ответа
+            keepalives=1,
+            keepalives_idle=5,
+            keepalives_interval=2,
+            keepalives_count=2,
         )
     except Exception as e:
         print(f"Ошибка подключения к базе {dbname}: {e}", file=sys.stderr)
@@ -35,70 +97,136 @@ def strip_leading_zeros(s):
     return str(int(s)) if s.isdigit() else s
 
 
-def fetch_poscards():
+def fetch_cached(table, load):
+    """Возвращает содержимое справочной таблицы из кэша, если она не менялась.
+
+    Отпечаток (число строк и максимальный xmin) меняется при любой вставке,
+    обновлении или удалении; кроме того, раз в REF_CACHE_TTL таблица
+    перечитывается целиком в любом случае.
+    """
+    entry = _ref_cache.get(table)
     conn = connect_to_db(DB_CONFIG["main_db"])
-    poscards = {}
     if not conn:
-        return poscards
+        # Последние известные данные подставит этап выборки (poll_once)
+        raise ConnectionError(f"нет подключения к базе {DB_CONFIG['main_db']}")
 
     try:
         with conn.cursor() as cur:
-            cur.execute("SELECT data FROM poscard_settings")
-            for (data,) in cur.fetchall():
-                shop_raw = str(data.get("Shop", "")).strip()
-                code = str(data.get("Code", "")).strip()
-                if not shop_raw or not code or shop_raw in EXCLUDED_SHOPS:
-                    continue
-                shop = strip_leading_zeros(shop_raw)
-                poscards[code] = {"shop": shop, "name": f"shop{shop}"}
-
-        for shop, code in STATIC_POSCODES.items():
-            poscards[code] = {"shop": shop, "name": f"shop{shop}"}
+            cur.execute(f"SELECT count(*), max(xmin::text::bigint) FROM {table}")
+            fingerprint = cur.fetchone()
+
+            if (
+                entry
+                and entry["fingerprint"] == fingerprint
+                and time.monotonic() - entry["loaded_at"] < REF_CACHE_TTL
+            ):
+                return entry["data"]
+
+            data = load(cur)
     finally:
         conn.close()
 
+    _ref_cache[table] = {
+        "fingerprint": fingerprint,
+        "data": data,
+        "loaded_at": time.monotonic(),
+    }
+    return data
+
+
+def fetch_poscards():
+    return fetch_cached("poscard_settings", load_poscards)
+
+
+def fetch_shop_names():
+    """Магазины по poscard_settings — те же имена, что в отчёте о сменах."""
+    return {info["name"] for info in fetch_poscards().values()}
+
+
+def load_poscards(cur):
+    poscards = {}
+    cur.execute("SELECT data FROM poscard_settings")
+    for (data,) in cur.fetchall():
+        shop_raw = str(data.get("Shop", "")).strip()
+        code = str(data.get("Code", "")).strip()
+        if not shop_raw or not code or shop_raw in EXCLUDED_SHOPS:
+            continue
+        shop = strip_leading_zeros(shop_raw)
+        poscards[code] = {"shop": shop, "name": f"shop{shop}"}
+
+    for shop, code in STATIC_POSCODES.items():
+        poscards[code] = {"shop": shop, "name": f"shop{shop}"}
+
     return poscards
 
 
 def fetch_users():
-    conn = connect_to_db(DB_CONFIG["main_db"])
-    users = []
-    if not conn:
-        return users
+    return fetch_cached("user_entity", load_users)
 
-    try:
-        with conn.cursor() as cur:
-            cur.execute("SELECT data FROM user_entity")
-            for (data,) in cur.fetchall():
-                shops = []
-                if "Shop" in data and data["Shop"]:
-                    shops = [str(data["Shop"])]
-                elif "Shops" in data and isinstance(data["Shops"], list):
-                    shops = [str(s) for s in data["Shops"] if s]
-                data["__shops__"] = [strip_leading_zeros(s) for s in shops]
-                users.append(data)
-    finally:
-        conn.close()
+
+def load_users(cur):
+    users = []
+    cur.execute("SELECT data FROM user_entity")
+    for (data,) in cur.fetchall():
+        shops = []
+        if "Shop" in data and data["Shop"]:
+            shops = [str(data["Shop"])]
+        elif "Shops" in data and isinstance(data["Shops"], list):
+            shops = [str(s) for s in data["Shops"] if s]
+        data["__shops__"] = [strip_leading_zeros(s) for s in shops]
+        users.append(data)
 
     return users
 
 
-def fetch_today_transactions(tranztype):
+def tx_time(tranzdate):
+    """Время транзакции как строка до секунд: одинаково для опроса и NOTIFY."""
+    if isinstance(tranzdate, str):
+        return tranzdate[:19]
+    return tranzdate.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class Transactions(list):
+    """Транзакции и снимок видимости (xmin, xmax, активные), на котором они
+    выбраны: по нему уведомление о строке, уже попавшей в опрос, не
+    засчитывается второй раз."""
+
+    snapshot = None
+
+
+def parse_snapshot(text):
+    xmin, xmax, xip = text.split(":")
+    return int(xmin), int(xmax), {int(x) for x in xip.split(",") if x}
+
+
+def txid_visible(txid, snapshot):
+    xmin, xmax, xip = snapshot
+    return txid < xmin or (txid < xmax and txid not in xip)
+
+
+def fetch_today_transactions(tranztype, day=None):
+    """Транзакции типа за день day (по умолчанию сегодня)."""
     conn = connect_to_db(DB_CONFIG["docs_db"])
-    tx = []
+    tx = Transactions()
     if not conn:
-        return tx
+        raise ConnectionError(f"нет подключения к базе {DB_CONFIG['docs_db']}")
 
-    today = datetime.now().date()
+    today = day or datetime.now().date()
     try:
+        # Снимок и выборка — в одной транзакции с общим снимком
+        conn.set_session(isolation_level="REPEATABLE READ", readonly=True)
         with conn.cursor() as cur:
+            cur.execute("SELECT txid_current_snapshot()::text")
+            tx.snapshot = parse_snapshot(cur.fetchone()[0])
             cur.execute(
-                "SELECT unitcode, seller FROM doctransaction_entity "
+                "SELECT unitcode, seller, tranzdate FROM doctransaction_entity "
                 "WHERE tranztype = %s AND tranzdate::date = %s",
                 (tranztype, today),
             )
-            for unitcode, seller in cur.fetchall():
-                tx.append((str(unitcode).strip(), str(seller).strip()))
+            for unitcode, seller, tranzdate in cur.fetchall():
+                tx.append(
+                    (str(unitcode).strip(), str(seller).strip(), tx_time(tranzdate))
+                )
     finally:
         conn.close()
 
@@ -111,7 +239,7 @@ def generate_shift_report(trans62, trans64, users, poscards):
 
     # Собиратель всех seller по unitcode
     sellers_by_unit = {}
-    for unitcode, seller in trans62 + trans64:
+    for unitcode, seller, _ in trans62 + trans64:
         sellers_by_unit.setdefault(unitcode, set()).add(seller)
 
     # Для каждого poscard
@@ -132,8 +260,67 @@ def generate_shift_report(trans62, trans64, users, poscards):
     return report
 
 
-def save_shift_report(report, filename="shops_smen.json"):
-    now_iso = datetime.now().isoformat()
+def generate_rollups(trans62, trans64, users, poscards):
+    """Итоги дня по магазинам: первая транзакция, число транзакций, кассиры."""
+    users_by_code = {u["Code"]: u for u in users}
+    rollups = {}
+    for unitcode, seller, tranzdate in trans62 + trans64:
+        info = poscards.get(unitcode)
+        if info is None:
+            continue
+        rollup = rollups.setdefault(
+            info["name"], {"first_tx": tranzdate, "tx_count": 0, "sellers": set()}
+        )
+        rollup["first_tx"] = min(rollup["first_tx"], tranzdate)
+        rollup["tx_count"] += 1
+        rollup["sellers"].add(seller)
+
+    for rollup in rollups.values():
+        cashiers = []
+        for seller in sorted(rollup.pop("sellers")):
+            user = users_by_code.get(seller)
+            uname = user.get("Name", "Неизвестно") if user else "Неизвестно"
+            cashiers.append({"user_code": seller, "user_name": uname})
+        rollup["cashiers"] = cashiers
+
+    return rollups
+
+
+# Итоги, уже записанные в историю за текущий день
+_written_rollups = {"day": None, "rollups": {}}
+
+
+def record_rollups(rollups, day):
+    """Дописывает в историю только изменившиеся за цикл итоги магазинов."""
+    if _written_rollups["day"] != day:
+        _written_rollups.update(day=day, rollups={})
+    written = _written_rollups["rollups"]
+
+    changed = {shop: r for shop, r in rollups.items() if written.get(shop) != r}
+    if not changed:
+        return
+    try:
+        shift_history.upsert_rollups(day, changed)
+    except Exception as e:
+        print(f"Ошибка записи истории смен: {e}", file=sys.stderr)
+        return
+    written.update(changed)
+
+
+SHIFT_REPORT_PATH = "shops_smen.json"
+# Файл-пульс: обновляется каждый цикл, даже если смены не менялись
+SHIFT_HEARTBEAT_PATH = "shops_smen.heartbeat.json"
+
+# Хэш последнего записанного отчёта и отчёт, уже выведенный в консоль
+_saved_hash = {}
+_printed_report = None
+
+
+def save_shift_report(report, filename=SHIFT_REPORT_PATH):
+    """Атомарно перезаписывает отчёт только при изменении содержимого.
+
+    Возвращает True, если файл был переписан.
+    """
     out = []
     for shop_name, data in sorted(report.items()):
         out.append(
@@ -141,42 +328,417 @@ def save_shift_report(report, filename="shops_smen.json"):
                 "name": shop_name,
                 "is_shift_open": data["is_shift_open"],
                 "cashiers": data["cashiers"],
-                "last_checked": now_iso,
             }
         )
-    with open(filename, "w", encoding="utf-8") as f:
-        json.dump(out, f, ensure_ascii=False, indent=2)
+    payload = dump_compact(out)
+    new_hash = content_hash(payload)
+
+    if filename not in _saved_hash:
+        _saved_hash[filename] = file_hash(filename)
+
+    changed = new_hash != _saved_hash[filename]
+    if changed:
+        write_atomic(filename, payload)
+        _saved_hash[filename] = new_hash
+
+    write_atomic(
+        SHIFT_HEARTBEAT_PATH,
+        dump_compact(
+            {
+                "last_checked": datetime.now().isoformat(),
+                "content_hash": new_hash,
+                "stale_sources": stale_sources,
+            }
+        ),
+    )
+    return changed
+
+
+def format_shop(shop_name, data):
+    if not data["is_shift_open"]:
+        return [f"{shop_name}: Смена НЕ ОТКРЫТА"]
+    return [
+        f"{shop_name}: Смена ОТКРЫТА — {c['user_name']} (код: {c['user_code']})"
+        for c in data["cashiers"]
+    ]
 
 
 def print_report(report):
-    print("Отчет по сменам:")
-    for shop_name, data in sorted(report.items()):
-        if data["is_shift_open"]:
-            for c in data["cashiers"]:
-                print(
-                    f"{shop_name}: Смена ОТКРЫТА — {c['user_name']} (код: {c['user_code']})"
+    """Печатает сводку при первом вызове, дальше только изменившиеся магазины."""
+    global _printed_report
+
+    if _printed_report is None:
+        opened = sum(1 for data in report.values() if data["is_shift_open"])
+        print(f"Отчет по сменам: {len(report)} магазинов, смен открыто: {opened}")
+    else:
+        for shop_name in sorted(report.keys() | _printed_report.keys()):
+            data = report.get(shop_name)
+            if data == _printed_report.get(shop_name):
+                continue
+            if data is None:
+                print(f"{shop_name}: удалён из отчёта")
+                continue
+            for line in format_shop(shop_name, data):
+                print(line)
+
+    _printed_report = report
+
+
+# Подписчики на новый отчёт; start.py передаёт отчёт в main.py в памяти
+report_listeners = []
+
+
+def publish_report(t62, t64, users, poscards, day):
+    """day — день, за который выбраны транзакции; под ним пишутся итоги."""
+    report = generate_shift_report(t62, t64, users, poscards)
+    recording.shifts(report)
+    save_shift_report(report)
+    print_report(report)
+    record_rollups(generate_rollups(t62, t64, users, poscards), day.isoformat())
+    for listener in report_listeners:
+        listener(report)
+    return report
+
+
+def run_cycle():
+    poscards, users, t62, t64, day = poll_once()
+    return publish_report(t62, t64, users, poscards, day)
+
+
+# Источники этапа выборки: имя -> (функция, аргументы)
+FETCH_SOURCES = {
+    "poscards": (fetch_poscards, ()),
+    "users": (fetch_users, ()),
+    "t62": (fetch_today_transactions, (62,)),
+    "t64": (fetch_today_transactions, (64,)),
+}
+# Данные за день: выбираются за день начала цикла, после полуночи
+# старые значения подставлять нельзя
+DAILY_SOURCES = {"t62", "t64"}
+
+# Последние удачные данные по источникам: имя -> (данные, день, время)
+_last_good = {}
+# Источники, для которых в отчёте использованы старые данные: имя -> с какого времени
+stale_sources = {}
+
+
+def poll_once():
+    """Выполняет все выборки параллельно, не дольше FETCH_DEADLINE.
+
+    Если источник не ответил, берутся его последние удачные данные,
+    а сам источник помечается в stale_sources. Транзакции прошлого дня
+    для подмены не годятся: тогда цикл завершается ошибкой.
+    Возвращает (poscards, users, t62, t64, день транзакций).
+    """
+    day = datetime.now().date()
+    executor = ThreadPoolExecutor(
+        max_workers=len(FETCH_SOURCES), thread_name_prefix="fetch"
+    )
+    futures = {
+        name: executor.submit(func, *args, *((day,) if name in DAILY_SOURCES else ()))
+        for name, (func, args) in FETCH_SOURCES.items()
+    }
+    done, _ = wait(futures.values(), timeout=FETCH_DEADLINE)
+    # Зависшие запросы дорабатывают в фоне, их ограничивает statement_timeout
+    executor.shutdown(wait=False)
+
+    now = datetime.now()
+    results = {}
+    for name, future in futures.items():
+        if future in done and future.exception() is None:
+            results[name] = future.result()
+            _last_good[name] = (results[name], day, now)
+            stale_sources.pop(name, None)
+            continue
+
+        error = future.exception() if future in done else "превышено время ожидания"
+        good = _last_good.get(name)
+        if good is None or (name in DAILY_SOURCES and good[1] != day):
+            raise RuntimeError(f"нет данных источника {name}: {error}")
+
+        results[name] = good[0]
+        stale_sources.setdefault(name, good[2].isoformat(timespec="seconds"))
+        print(
+            f"Источник {name} недоступен ({error}), используются данные на "
+            f"{stale_sources[name]}",
+            file=sys.stderr,
+        )
+
+    return results["poscards"], results["users"], results["t62"], results["t64"], day
+
+
+# Активность магазинов: число транзакций по минутам за последний час и
+# время последней транзакции. Каждый цикл читает с сервера только
+# агрегаты GROUP BY unitcode, минута начиная с отметки последней
+# прочитанной транзакции; ACTIVITY_OVERLAP последних минут перечитываются
+# целиком, чтобы учесть транзакции, пришедшие с кассы с задержкой.
+ACTIVITY_INTERVAL = 30  # сек
+ACTIVITY_WINDOW = 60  # мин
+ACTIVITY_OVERLAP = 2  # мин
+# Считаются только продажи (те же типы, что для смен): на панели это
+# «последняя продажа», возвраты и служебные документы её не обновляют.
+# None — документы всех типов
+ACTIVITY_TRANZTYPES = SHIFT_TRANZTYPES
+SHOP_ACTIVITY_PATH = "shop_activity.json"
+
+# Состояние: отметка, счётчики unitcode -> {минута: число}, последние транзакции
+_activity = {"watermark": None, "buckets": {}, "last_tx": {}}
+activity_listeners = []
+
+
+def tx_datetime(tranzdate):
+    """Время транзакции как наивный datetime в местном времени."""
+    if isinstance(tranzdate, str):
+        return datetime.fromisoformat(tx_time(tranzdate))
+    if tranzdate.tzinfo is not None:
+        return tranzdate.astimezone().replace(tzinfo=None)
+    return tranzdate
+
+
+def fetch_activity():
+    """Обновляет счётчики активности и возвращает их по unitcode."""
+    conn = connect_to_db(DB_CONFIG["docs_db"])
+    if not conn:
+        raise ConnectionError(f"нет подключения к базе {DB_CONFIG['docs_db']}")
+
+    now = datetime.now()
+    window_start = (now - timedelta(minutes=ACTIVITY_WINDOW)).replace(
+        second=0, microsecond=0
+    )
+    buckets = _activity["buckets"]
+    last_tx = _activity["last_tx"]
+    type_filter, type_params = "", []
+    if ACTIVITY_TRANZTYPES:
+        type_filter, type_params = " AND tranztype IN %s", [tuple(ACTIVITY_TRANZTYPES)]
+
+    try:
+        with conn.cursor() as cur:
+            if _activity["watermark"] is None:
+                # Первый запуск: последние транзакции за сегодня одной строкой
+                # на магазин, счётчики — только за окно
+                cur.execute(
+                    "SELECT unitcode, max(tranzdate) FROM doctransaction_entity "
+                    f"WHERE tranzdate >= %s{type_filter} GROUP BY unitcode",
+                    [now.replace(hour=0, minute=0, second=0, microsecond=0)]
+                    + type_params,
                 )
+                for unitcode, latest in cur.fetchall():
+                    last_tx[str(unitcode).strip()] = tx_datetime(latest)
+                cutoff = window_start
+            else:
+                cutoff = _activity["watermark"] - timedelta(minutes=ACTIVITY_OVERLAP)
+                cutoff = max(cutoff.replace(second=0, microsecond=0), window_start)
+
+            cur.execute(
+                "SELECT unitcode, date_trunc('minute', tranzdate) AS minute, "
+                "count(*), max(tranzdate) FROM doctransaction_entity "
+                f"WHERE tranzdate >= %s{type_filter} GROUP BY unitcode, minute",
+                [cutoff] + type_params,
+            )
+            rows = cur.fetchall()
+    finally:
+        conn.close()
+
+    # Минуты от cutoff пришли заново, минуты до начала окна больше не нужны
+    for unit_buckets in buckets.values():
+        for minute in [m for m in unit_buckets if m >= cutoff or m < window_start]:
+            del unit_buckets[minute]
+
+    watermark = _activity["watermark"] or cutoff
+    for unitcode, minute, count, latest in rows:
+        unitcode = str(unitcode).strip()
+        latest = tx_datetime(latest)
+        buckets.setdefault(unitcode, {})[tx_datetime(minute)] = count
+        if unitcode not in last_tx or latest > last_tx[unitcode]:
+            last_tx[unitcode] = latest
+        watermark = max(watermark, latest)
+    # Время с касс может убегать вперёд, отметка не дальше текущего момента
+    _activity["watermark"] = min(watermark, now)
+
+    return {
+        unitcode: {
+            "last_tx": tx_time(latest),
+            "tx_last_hour": sum(buckets.get(unitcode, {}).values()),
+        }
+        for unitcode, latest in last_tx.items()
+    }
+
+
+def publish_activity(activity, poscards):
+    """Сводит активность по магазинам и передаёт её в main.py."""
+    by_shop = {}
+    for unitcode, data in activity.items():
+        info = poscards.get(unitcode)
+        if info is None:
+            continue
+        shop = by_shop.get(info["name"])
+        # У магазина может быть несколько касс
+        if shop is None:
+            by_shop[info["name"]] = dict(data)
         else:
-            print(f"{shop_name}: Смена НЕ ОТКРЫТА")
+            shop["last_tx"] = max(shop["last_tx"], data["last_tx"])
+            shop["tx_last_hour"] += data["tx_last_hour"]
 
+    write_atomic(SHOP_ACTIVITY_PATH, dump_compact(by_shop))
+    for listener in activity_listeners:
+        listener(by_shop)
+    return by_shop
 
-def main():
+
+def run_activity_cycle():
+    return publish_activity(fetch_activity(), fetch_poscards())
+
+
+def activity_loop():
     while True:
         try:
-            poscards = fetch_poscards()
-            users = fetch_users()
-            t62 = fetch_today_transactions(62)
-            t64 = fetch_today_transactions(64)
+            run_activity_cycle()
+        except Exception as e:
+            print(f"Ошибка обновления активности магазинов: {e}", file=sys.stderr)
+        time.sleep(ACTIVITY_INTERVAL)
+
+
+def ensure_notify_trigger(conn, install=False):
+    """Проверяет наличие триггера уведомлений, при install=True создаёт
+    или обновляет его."""
+    with conn.cursor() as cur:
+        cur.execute(
+            "SELECT p.prosrc FROM pg_trigger t JOIN pg_proc p ON p.oid = t.tgfoid "
+            "WHERE t.tgname = %s AND NOT t.tgisinternal",
+            (NOTIFY_TRIGGER,),
+        )
+        row = cur.fetchone()
+        current = row is not None and "txid_current" in row[0]
+        if current:
+            return True
+        if not install:
+            if row is not None:
+                print(
+                    f"Триггер {NOTIFY_TRIGGER} старой версии: без txid вставки "
+                    "на границе сверки могут учитываться дважды, обновите его "
+                    "запуском с --install-trigger",
+                    file=sys.stderr,
+                )
+            return row is not None
+        cur.execute(NOTIFY_TRIGGER_SQL)
+        print(f"Триггер {NOTIFY_TRIGGER} установлен")
+        return True
+
+
+def apply_notification(payload, tx_by_type, today, snapshots):
+    """Добавляет транзакцию из уведомления, возвращает True если набор изменился.
+
+    Уведомление о транзакции, видимой в снимке сверочного опроса, пропускается:
+    её строка уже есть в выборке.
+    """
+    try:
+        data = json.loads(payload)
+        tranztype = int(data["tranztype"])
+        tranzdate = str(data["tranzdate"])
+    except (ValueError, KeyError, TypeError) as e:
+        print(f"Некорректное уведомление {payload!r}: {e}", file=sys.stderr)
+        return False
+
+    if tranztype not in tx_by_type or not tranzdate.startswith(today.isoformat()):
+        return False
+
+    txid = data.get("txid")
+    snapshot = snapshots.get(tranztype)
+    if txid is not None and snapshot is not None and txid_visible(int(txid), snapshot):
+        return False
+
+    tx_by_type[tranztype].append(
+        (
+            str(data["unitcode"]).strip(),
+            str(data["seller"]).strip(),
+            tx_time(tranzdate),
+        )
+    )
+    return True
+
+
+def listen_loop(install_trigger=False):
+    """Обновляет смены по NOTIFY, раз в RECONCILE_INTERVAL сверяется полным опросом."""
+    conn = connect_to_db(DB_CONFIG["docs_db"])
+    if not conn:
+        raise ConnectionError("нет подключения к базе документов")
+
+    try:
+        conn.autocommit = True
+        if not ensure_notify_trigger(conn, install_trigger):
+            raise RuntimeError(
+                f"триггер {NOTIFY_TRIGGER} не найден, запустите с --install-trigger"
+            )
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+
+        tx_by_type = {}
+        snapshots = {}
+        poscards, users = {}, []
+        last_reconcile = None
+        day = None
+
+        while True:
+            now = time.monotonic()
+            if (
+                last_reconcile is None
+                or now - last_reconcile >= RECONCILE_INTERVAL
+                or day != datetime.now().date()
+            ):
+                # Сначала забираем накопившиеся уведомления, затем опрос:
+                # так ни одна вставка между ними не потеряется
+                conn.poll()
+                conn.notifies.clear()
+                poscards, users, t62, t64, day = poll_once()
+                tx_by_type = {62: list(t62), 64: list(t64)}
+                snapshots = {62: t62.snapshot, 64: t64.snapshot}
+                publish_report(t62, t64, users, poscards, day)
+                last_reconcile = now
+                continue
+
+            timeout = RECONCILE_INTERVAL - (now - last_reconcile)
+            if select.select([conn], [], [], timeout) == ([], [], []):
+                continue
+
+            conn.poll()
+            changed = False
+            while conn.notifies:
+                notify = conn.notifies.pop(0)
+                changed |= apply_notification(
+                    notify.payload, tx_by_type, day, snapshots
+                )
 
-            report = generate_shift_report(t62, t64, users, poscards)
-            save_shift_report(report)
-            print_report(report)
+            if changed:
+                publish_report(tx_by_type[62], tx_by_type[64], users, poscards, day)
+    finally:
+        conn.close()
 
-            print("\nЖдём 10 секунд до следующего обновления...\n")
-            time.sleep(10)
+
+def main():
+    listen = "--listen" in sys.argv or "--install-trigger" in sys.argv
+    install_trigger = "--install-trigger" in sys.argv
+    recording.start_from_env(".shifts")
+
+    threading.Thread(target=activity_loop, name="activity", daemon=True).start()
+
+    while True:
+        if listen:
+            try:
+                listen_loop(install_trigger)
+            except Exception as e:
+                print(
+                    f"Режим LISTEN прерван: {e}, переподключение через {POLL_INTERVAL} сек",
+                    file=sys.stderr,
+                )
+                time.sleep(POLL_INTERVAL)
+            continue
+
+        try:
+            run_cycle()
+            time.sleep(POLL_INTERVAL)
         except Exception as e:
             print(f"Ошибка во время обновления: {e}", file=sys.stderr)
-            time.sleep(10)
+            time.sleep(POLL_INTERVAL)
 
 
 if __name__ == "__main__":
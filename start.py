@@ -1,28 +1,224 @@
-import subprocess
+import startup_trace
+
+startup_trace.mark("interpreter")
+
+import asyncio
+import logging
+import sys
 import threading
+import time
+from datetime import datetime
+
+from werkzeug.serving import make_server
+
+import main
+import ping
+import profiling
+import shift_watcher
+
+# Все компоненты работают в одном процессе и обмениваются данными в памяти:
+# адреса из ping.py и отчёт о сменах сразу попадают в main.py.
+
+# Пауза перед перезапуском упавшего компонента: от BACKOFF_MIN
+# с удвоением до BACKOFF_MAX; после BACKOFF_RESET сек стабильной работы
+# пауза снова сбрасывается к минимальной
+BACKOFF_MIN = 1
+BACKOFF_MAX = 300
+BACKOFF_RESET = 600
+
+# Режим LISTEN/NOTIFY для shift_watcher
+SHIFT_LISTEN = "--listen" in sys.argv or "--install-trigger" in sys.argv
+SHIFT_INSTALL_TRIGGER = "--install-trigger" in sys.argv
+
+
+async def run_in_thread(func, *args):
+    """Выполняет блокирующую функцию в daemon-потоке.
+
+    В отличие от asyncio.to_thread, зависший поток (select, ping)
+    не задерживает завершение процесса.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def resolve(result, error):
+        if future.cancelled():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def target():
+        try:
+            result = func(*args)
+        except BaseException as e:
+            loop.call_soon_threadsafe(resolve, None, e)
+        else:
+            loop.call_soon_threadsafe(resolve, result, None)
+
+    threading.Thread(target=target, name=func.__name__, daemon=True).start()
+    return await future
+
+
+async def run_cycle(name, func, *args):
+    """Выполняет один цикл компонента name в потоке.
+
+    Ошибка цикла (база или сеть недоступны) не считается падением
+    компонента: она пишется в лог и в last_error, результат — None,
+    а следующий цикл идёт в обычный срок.
+    """
+    try:
+        return await run_in_thread(func, *args)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        logging.error(f"[{name}] ошибка цикла: {error}")
+        entry = main.component_health.get(name)
+        if entry is not None:
+            entry["last_error"] = error
+        return None
+
+
+async def every(name, interval, func, *args):
+    """Вызывает func с периодом interval, не накапливая опоздания."""
+    while True:
+        started = time.monotonic()
+        await run_cycle(name, func, *args)
+        await asyncio.sleep(max(0, interval - (time.monotonic() - started)))
+
+
+async def probe_component():
+    stop = threading.Event()
+    try:
+        await run_in_thread(main.run_prober, stop)
+    finally:
+        stop.set()
+
 
+async def resolver_component():
+    while True:
+        shops = await run_cycle(
+            "resolver", profiling.timed("resolver", ping.update_shop_list)
+        )
+        # Пустой список не применяем: его ещё не заполнила сверка
+        if shops:
+            main.apply_store_list(shops)
+        await asyncio.sleep(ping.RESOLVE_INTERVAL)
 
-def stream_output(process, name):
-    for line in process.stdout:
-        print(f"[{name}] {line.rstrip()}")
 
+def sync_inventory():
+    return ping.sync_inventory(shift_watcher.fetch_shop_names())
 
-processes = []
-scripts = [("main.py", "МОРДА"), ("ping.py", "PING")]
 
-for script, name in scripts:
-    p = subprocess.Popen(
-        ["python", script],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.STDOUT,
-        bufsize=1,
-        text=True,  # Включаем текстовый режим, чтобы построчная буферизация работала
+async def inventory_component():
+    """Добавляет и убирает магазины по poscard_settings без полного обновления."""
+    while True:
+        result = await run_cycle(
+            "inventory", profiling.timed("inventory", sync_inventory)
+        )
+        if result is not None:
+            changed, removed = result
+            main.remove_stores(removed)
+            main.upsert_stores(changed)
+        await asyncio.sleep(ping.INVENTORY_INTERVAL)
+
+
+async def shift_component():
+    if SHIFT_LISTEN:
+        await run_in_thread(shift_watcher.listen_loop, SHIFT_INSTALL_TRIGGER)
+    else:
+        await every(
+            "shifts",
+            shift_watcher.POLL_INTERVAL,
+            profiling.timed("shift_cycle", shift_watcher.run_cycle),
+        )
+
+
+async def activity_component():
+    await every(
+        "activity",
+        shift_watcher.ACTIVITY_INTERVAL,
+        profiling.timed("activity", shift_watcher.run_activity_cycle),
+    )
+
+
+async def web_component():
+    server = make_server(main.HOST, main.PORT, main.app, threaded=True)
+    startup_trace.mark("http")
+    try:
+        await run_in_thread(server.serve_forever)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+COMPONENTS = {
+    "probe": probe_component,
+    "resolver": resolver_component,
+    "inventory": inventory_component,
+    "shifts": shift_component,
+    "activity": activity_component,
+    "web": web_component,
+}
+
+
+def set_health(name, state, **fields):
+    entry = main.component_health.setdefault(
+        name, {"restarts": 0, "last_error": None}
     )
-    t = threading.Thread(target=stream_output, args=(p, name))
-    t.start()
-    processes.append((p, t))
-
-# Ждем завершения всех потоков
-for p, t in processes:
-    p.wait()
-    t.join()
+    entry.update(state=state, since=datetime.now().isoformat(), **fields)
+
+
+async def supervise(name, component):
+    """Держит компонент запущенным, перезапуская его с нарастающей паузой."""
+    backoff = BACKOFF_MIN
+    while True:
+        set_health(name, "running")
+        started = time.monotonic()
+        try:
+            await component()
+            error = "компонент завершился"
+        except asyncio.CancelledError:
+            set_health(name, "stopped")
+            raise
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+
+        if time.monotonic() - started >= BACKOFF_RESET:
+            backoff = BACKOFF_MIN
+
+        restarts = main.component_health[name]["restarts"] + 1
+        set_health(name, "backoff", restarts=restarts, last_error=error)
+        logging.error(f"[{name}] {error}, перезапуск через {backoff} сек")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, BACKOFF_MAX)
+
+
+async def run():
+    shift_watcher.report_listeners.append(main.ingest_shift_report)
+    shift_watcher.activity_listeners.append(main.ingest_shop_activity)
+    for name in COMPONENTS:
+        set_health(name, "starting")
+
+    # HTTP поднимается первым, данные загружаются уже при работающем сервере
+    tasks = [asyncio.create_task(supervise("web", web_component), name="web")]
+    try:
+        await run_in_thread(main.warm_start, False)
+        tasks += [
+            asyncio.create_task(supervise(name, component), name=name)
+            for name, component in COMPONENTS.items()
+            if name != "web"
+        ]
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if main.scheduler is not None:
+            main.scheduler.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    startup_trace.mark("imports")
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,19 @@
+import os
+import sys
+import time
+
+# Отметки этапов запуска для bench_startup.py. Включаются переменной
+# окружения MAG_SERV_STARTUP_TRACE=1 и пишутся в stderr строками
+# "STARTUP <этап> <epoch>"; каждый этап отмечается один раз.
+ENABLED = os.environ.get("MAG_SERV_STARTUP_TRACE") == "1"
+
+_seen = set()
+
+
+def mark(phase):
+    if not ENABLED or phase in _seen:
+        return
+    _seen.add(phase)
+    # Одной записью, чтобы строку не разорвал вывод логов из других потоков
+    sys.stderr.write(f"STARTUP {phase} {time.time():.6f}\n")
+    sys.stderr.flush()
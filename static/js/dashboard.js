@@ -0,0 +1,302 @@
+// Таблица магазинов: данные хранятся в словаре по ключу магазина,
+// в DOM есть только строки, попадающие в окно прокрутки, а при опросе
+// меняются только те ячейки, значения которых действительно изменились.
+
+const OVERSCAN = 10;  // запас строк выше и ниже видимой области
+
+const STALE_ICON_TITLE = 'Данные до перезапуска, ожидается свежий опрос';
+
+const ROUTER_ICONS = {
+    'Работает': 'fa-check-circle',
+    'Касса не в сети': 'fa-exclamation-circle',
+};
+
+const model = new Map();    // магазин -> последние данные из /status
+const rowCache = new Map(); // магазин -> {tr, cells, shown}
+let order = [];             // порядок магазинов от сервера
+let filtered = [];          // магазины, прошедшие фильтры
+let rowHeight = 78;
+let windowStart = -1;
+let windowEnd = -1;
+
+const scroller = document.getElementById('stores-scroll');
+const tbody = document.getElementById('stores-table');
+const topSpacer = createSpacer();
+const bottomSpacer = createSpacer();
+
+function createSpacer() {
+    const tr = document.createElement('tr');
+    tr.className = 'spacer';
+    const td = document.createElement('td');
+    td.colSpan = 4;
+    tr.appendChild(td);
+    return tr;
+}
+
+function statusClass(info) {
+    return (info.status || 'Unknown').toLowerCase();
+}
+
+function activityText(activity) {
+    if (!activity) {
+        return '';
+    }
+    return 'Последняя продажа ' + activity.minutes_ago + ' мин назад, '
+        + activity.tx_per_hour + ' за час';
+}
+
+function createRow(store) {
+    const tr = document.createElement('tr');
+    tr.dataset.store = store;
+    tr.innerHTML =
+        '<td><strong></strong><br><small></small></td>' +
+        '<td><span class="status"><i class="fas fa-circle"></i> <span></span></span></td>' +
+        '<td><div class="router-status"><i class="fas"></i> <span></span></div></td>' +
+        '<td class="last-updated"><span></span> <i class="fas fa-history"></i></td>';
+
+    const cells = {
+        nameCell: tr.querySelector('td'),
+        name: tr.querySelector('strong'),
+        ip: tr.querySelector('small'),
+        status: tr.querySelector('.status span'),
+        routerIcon: tr.querySelector('.router-status i'),
+        router: tr.querySelector('.router-status span'),
+        updated: tr.querySelector('.last-updated span'),
+        staleIcon: tr.querySelector('.last-updated i'),
+    };
+    cells.name.textContent = store.substring(4);
+    cells.staleIcon.title = STALE_ICON_TITLE;
+
+    const row = {tr, cells, shown: {}};
+    rowCache.set(store, row);
+    patchRow(row, model.get(store));
+    return row;
+}
+
+// Переносит в DOM только отличающиеся значения
+function patchRow(row, info) {
+    const shown = row.shown;
+    const cells = row.cells;
+    const cls = statusClass(info);
+    const stale = !!info.stale;
+
+    if (shown.cls !== cls || shown.stale !== stale) {
+        row.tr.className = 'store-row ' + cls + (stale ? ' stale' : '');
+        shown.cls = cls;
+    }
+    // Ответил резервный канал — показываем, по какому адресу
+    const ip = info.via && info.via !== info.ip ? info.ip + ' → ' + info.via : info.ip;
+    if (shown.ip !== ip) {
+        cells.ip.textContent = ip;
+        shown.ip = ip;
+    }
+    if (shown.status !== info.status) {
+        cells.status.textContent = info.status;
+        shown.status = info.status;
+    }
+    if (shown.router !== info.router) {
+        cells.routerIcon.className = 'fas ' + (ROUTER_ICONS[info.router] || 'fa-times-circle');
+        cells.router.textContent = info.router;
+        shown.router = info.router;
+    }
+    if (shown.updated !== info.last_updated) {
+        cells.updated.textContent = info.last_updated;
+        shown.updated = info.last_updated;
+    }
+    const activity = activityText(info.activity);
+    if (shown.activity !== activity) {
+        cells.nameCell.title = activity;
+        shown.activity = activity;
+    }
+    if (shown.stale !== stale) {
+        cells.staleIcon.style.display = stale ? '' : 'none';
+        shown.stale = stale;
+    }
+}
+
+function matchesFilters(store, info, filters) {
+    const rowStatus = info.status === 'Online' ? 'online' : 'offline';
+    const rowVpn = info.vpn === 'Новая VPN' ? 'new' : 'old';
+    return (filters.status === 'all' || rowStatus === filters.status)
+        && (filters.vpn === 'all' || rowVpn === filters.vpn)
+        && (filters.search === '' || store.substring(4).includes(filters.search));
+}
+
+function currentFilters() {
+    return {
+        status: document.getElementById('status-filter').value,
+        vpn: document.getElementById('vpn-filter').value,
+        search: document.getElementById('search-store').value.toLowerCase(),
+    };
+}
+
+// Отрисовывает строки, попадающие в окно прокрутки
+function renderWindow(force) {
+    const viewport = scroller.clientHeight || 600;
+    const first = Math.floor(scroller.scrollTop / rowHeight);
+    const start = Math.max(0, first - OVERSCAN);
+    const end = Math.min(filtered.length, first + Math.ceil(viewport / rowHeight) + OVERSCAN);
+
+    if (!force && start === windowStart && end === windowEnd) {
+        return;
+    }
+    windowStart = start;
+    windowEnd = end;
+
+    const fragment = document.createDocumentFragment();
+    topSpacer.firstChild.style.height = (start * rowHeight) + 'px';
+    fragment.appendChild(topSpacer);
+    for (let i = start; i < end; i++) {
+        const store = filtered[i];
+        fragment.appendChild((rowCache.get(store) || createRow(store)).tr);
+    }
+    bottomSpacer.firstChild.style.height = ((filtered.length - end) * rowHeight) + 'px';
+    fragment.appendChild(bottomSpacer);
+    tbody.replaceChildren(fragment);
+
+    // Высоту строки берём из фактической разметки
+    const sample = tbody.querySelector('tr.store-row');
+    if (sample && sample.offsetHeight && sample.offsetHeight !== rowHeight) {
+        rowHeight = sample.offsetHeight;
+        renderWindow(true);
+    }
+}
+
+function applyFilters() {
+    const filters = currentFilters();
+    filtered = order.filter(store => matchesFilters(store, model.get(store), filters));
+    renderWindow(true);
+}
+
+// Счётчики считает сервер (/summary), полный список для них не нужен
+function updateCounters(summary) {
+    $('#total-stores').text(summary.total + ' магазинов');
+    $('#online-stores').text(summary.online + ' онлайн');
+    $('#offline-stores').text((summary.total - summary.online) + ' оффлайн');
+}
+
+function ingestStatus(data) {
+    const filters = currentFilters();
+    let membershipChanged = false;
+
+    const stores = Object.keys(data);
+    if (stores.length !== order.length || stores.some((store, i) => store !== order[i])) {
+        order = stores;
+        for (const store of rowCache.keys()) {
+            if (!(store in data)) {
+                rowCache.delete(store);
+            }
+        }
+        membershipChanged = true;
+    }
+
+    for (const store of stores) {
+        const info = data[store];
+        const previous = model.get(store);
+        model.set(store, info);
+
+        if (previous && !membershipChanged
+            && matchesFilters(store, previous, filters) !== matchesFilters(store, info, filters)) {
+            membershipChanged = true;
+        }
+
+        const row = rowCache.get(store);
+        if (row) {
+            patchRow(row, info);
+        }
+    }
+
+    if (membershipChanged) {
+        applyFilters();
+    }
+}
+
+// Офлайн при открытой смене: порядок и время начала простоя дает сервер,
+// адрес и кассиры берутся из уже загруженного /status
+function minutesSince(iso) {
+    return Math.max(0, Math.floor((Date.now() - new Date(iso).getTime()) / 60000));
+}
+
+function renderPriority(entries) {
+    const list = $('#priority-list').empty();
+    for (const entry of entries) {
+        const info = model.get(entry.store) || {};
+        const cashiers = ((info.shift || {}).cashiers || []).map(c => c.user_name).join(', ');
+        const item = $('<li>');
+        $('<strong>').text(entry.store).appendTo(item);
+        $('<small>').text(info.ip || '').appendTo(item);
+        $('<span class="priority-duration">')
+            .text(minutesSince(entry.offline_since) + ' мин офлайн')
+            .attr('title', 'С ' + entry.offline_since)
+            .appendTo(item);
+        if (cashiers) {
+            $('<span class="priority-cashiers">').text(cashiers).appendTo(item);
+        }
+        list.append(item);
+    }
+    $('#priority-section').prop('hidden', entries.length === 0);
+}
+
+function fetchStatus() {
+    $.get('/status', ingestStatus);
+    $.get('/summary', updateCounters);
+    $.get('/priority', renderPriority);
+}
+
+// Автоматическое обновление каждые 10 секунд
+setInterval(fetchStatus, 10000);
+
+scroller.addEventListener('scroll', () => {
+    window.requestAnimationFrame(() => renderWindow(false));
+}, {passive: true});
+
+window.addEventListener('resize', () => renderWindow(true));
+
+// Поиск и фильтрация
+$('#status-filter, #vpn-filter').change(function() {
+    scroller.scrollTop = 0;
+    applyFilters();
+});
+
+// Обновляем обработчик поиска
+$('#search-store').keyup(function() {
+    scroller.scrollTop = 0;
+    applyFilters();
+});
+
+// Сброс фильтров
+$('#reset-filters').click(function() {
+    const btn = $(this);
+
+    // Убираем стандартную пульсацию
+    btn.removeClass('pulse');
+
+    // Добавляем активное состояние с pulse-red
+    btn.addClass('active pulse-red');
+
+    // Сбрасываем значения фильтров
+    $('#status-filter').val('all');
+    $('#vpn-filter').val('all');
+    $('#search-store').val('');
+
+    // Применяем фильтры
+    scroller.scrollTop = 0;
+    applyFilters();
+
+    // Возвращаем стандартный стиль через 0.75 секунды
+    setTimeout(() => {
+        btn.removeClass('active pulse-red');
+
+        // Возвращаем стандартную пульсацию после небольшой задержки
+        setTimeout(() => {
+            btn.addClass('pulse');
+        }, 200);
+    }, 750);
+});
+
+// Инициализация: первая отрисовка из данных, встроенных в страницу
+$(document).ready(function() {
+    $('#reset-filters').addClass('pulse');
+    ingestStatus(JSON.parse(document.getElementById('initial-status').textContent));
+    renderPriority(JSON.parse(document.getElementById('initial-priority').textContent));
+});
@@ -0,0 +1,43 @@
+// Проверка системной темы
+function getSystemTheme() {
+    return window.matchMedia && window.matchMedia('(prefers-color-scheme: dark)').matches ? 'dark' : 'light';
+}
+
+// Проверка сохраненной темы в localStorage
+function getSavedTheme() {
+    return localStorage.getItem('theme');
+}
+
+// Установка темы
+function setTheme(theme) {
+    document.documentElement.setAttribute('data-theme', theme);
+    localStorage.setItem('theme', theme);
+    updateThemeButton(theme);
+}
+
+// Обновление кнопки переключения темы
+function updateThemeButton(theme) {
+    const btn = document.getElementById('theme-toggle');
+    if (btn) {
+        btn.innerHTML = theme === 'dark' 
+            ? '<i class="fas fa-sun"></i>' 
+            : '<i class="fas fa-moon"></i>';
+    }
+}
+
+// Инициализация темы при загрузке
+function initTheme() {
+    const savedTheme = getSavedTheme();
+    const systemTheme = getSystemTheme();
+    const theme = savedTheme || systemTheme;
+    setTheme(theme);
+}
+
+// Переключение темы
+function toggleTheme() {
+    const currentTheme = document.documentElement.getAttribute('data-theme');
+    const newTheme = currentTheme === 'dark' ? 'light' : 'dark';
+    setTheme(newTheme);
+}
+
+document.addEventListener('DOMContentLoaded', initTheme);
@@ -0,0 +1,213 @@
+import threading
+from datetime import datetime
+from enum import IntEnum
+
+# Состояние магазина хранится компактно: коды статуса и вердикта роутера —
+# небольшие целые, время — epoch. Строки для интерфейса и выгрузок
+# получаются только при сериализации.
+
+
+class Status(IntEnum):
+    UNKNOWN = 0
+    ONLINE = 1
+    OFFLINE = 2
+
+
+class Router(IntEnum):
+    UNKNOWN = 0
+    OK = 1
+    CASHBOX_DOWN = 2
+    ROUTER_DOWN = 3
+    NEEDS_CHECK = 4
+    UPSTREAM_DOWN = 5  # не опрашивался: недоступен узел связи выше по карте
+
+
+STATUS_LABELS = ("Unknown", "Online", "Offline")
+ROUTER_LABELS = (
+    "Unknown",
+    "Работает",
+    "Касса не в сети",
+    "Роутер не в сети",
+    "Требуется проверка",
+    "Недоступен узел связи",
+)
+
+STATUS_BY_LABEL = {label: Status(i) for i, label in enumerate(STATUS_LABELS)}
+ROUTER_BY_LABEL = {label: Router(i) for i, label in enumerate(ROUTER_LABELS)}
+
+
+class StoreRecord:
+    __slots__ = (
+        "ip",
+        "vpn",
+        "backup",
+        "via",
+        "status",
+        "router",
+        "updated",
+        "changed",
+        "stale",
+    )
+
+    def __init__(
+        self,
+        ip,
+        vpn,
+        status=Status.UNKNOWN,
+        router=Router.UNKNOWN,
+        updated=0.0,
+        changed=None,
+        stale=False,
+        backup=(),
+    ):
+        self.ip = ip
+        self.vpn = vpn
+        self.backup = backup  # резервные каналы: кортеж (ip, vpn)
+        self.via = None  # адрес, ответивший при последнем опросе
+        self.status = status
+        self.router = router
+        self.updated = updated  # epoch последнего опроса
+        self.changed = changed  # epoch последней смены статуса или None
+        self.stale = stale
+
+    def to_dict(self):
+        return {
+            "ip": self.ip,
+            "vpn": self.vpn,
+            "backup_ips": [ip for ip, _ in self.backup],
+            "via": self.via,
+            "status": STATUS_LABELS[self.status],
+            "router": ROUTER_LABELS[self.router],
+            "last_updated": format_time(self.updated),
+            "changed_at": format_iso(self.changed),
+            "stale": self.stale,
+        }
+
+
+def format_time(ts):
+    return datetime.fromtimestamp(ts).strftime("%H:%M:%S")
+
+
+def format_iso(ts):
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts).isoformat(timespec="seconds")
+
+
+class StatusCounters:
+    """Счётчики магазинов по статусам, всего и по группам.
+
+    Группы магазина — небольшой кортеж пар (вид, значение), например
+    ("vpn", "Новая VPN"). Смена статуса или групп одного магазина
+    правит только его счётчики, без обхода всего списка.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._members = {}  # магазин -> (группы, статус)
+        self._total = [0] * len(Status)
+        self._groups = {}  # (вид, значение) -> [число по каждому Status]
+
+    def _shift(self, groups, status, delta):
+        self._total[status] += delta
+        for key in groups:
+            counts = self._groups.get(key)
+            if counts is None:
+                counts = self._groups[key] = [0] * len(Status)
+            counts[status] += delta
+            if not any(counts):
+                del self._groups[key]
+
+    def update(self, store, status=None, groups=None):
+        """Задаёт статус и/или группы магазина; None — оставить как есть."""
+        with self._lock:
+            old = self._members.get(store)
+            if old is None:
+                old_groups, old_status = (), None
+            else:
+                old_groups, old_status = old
+            new_groups = old_groups if groups is None else groups
+            new_status = old_status if status is None else status
+            if new_status is None:
+                new_status = Status.UNKNOWN
+            if old is not None:
+                if (old_groups, old_status) == (new_groups, new_status):
+                    return
+                self._shift(old_groups, old_status, -1)
+            self._shift(new_groups, new_status, 1)
+            self._members[store] = (new_groups, new_status)
+
+    def remove(self, store):
+        with self._lock:
+            old = self._members.pop(store, None)
+            if old is not None:
+                self._shift(*old, -1)
+
+    def summary(self):
+        def labelled(counts):
+            return {status.name.lower(): counts[status] for status in Status}
+
+        with self._lock:
+            result = {"total": len(self._members), **labelled(self._total)}
+            for (kind, value), counts in sorted(
+                self._groups.items(), key=lambda item: (item[0][0], str(item[0][1]))
+            ):
+                result.setdefault(f"by_{kind}", {})[value] = labelled(counts)
+        return result
+
+
+class PriorityIndex:
+    """Магазины офлайн при открытой смене, самый долгий простой первым.
+
+    Оба признака задаются по мере поступления опросов и отчётов о сменах,
+    упорядоченный список пересобирается только при смене состава и
+    отдаётся готовым.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._offline = {}  # магазин -> epoch начала простоя
+        self._open = set()  # магазины с открытой сменой
+        self._view = []
+
+    def _rebuild(self):
+        self._view = [
+            {"store": store, "offline_since": format_iso(since)}
+            for since, store in sorted(
+                (since, store)
+                for store, since in self._offline.items()
+                if store in self._open
+            )
+        ]
+
+    def set_offline(self, store, since):
+        """since — начало простоя или None, если магазин на связи."""
+        with self._lock:
+            if since is None:
+                if self._offline.pop(store, None) is None:
+                    return
+            elif self._offline.get(store) == since:
+                return
+            else:
+                self._offline[store] = since
+            if store in self._open:
+                self._rebuild()
+
+    def set_shift(self, store, is_open):
+        with self._lock:
+            if is_open == (store in self._open):
+                return
+            if is_open:
+                self._open.add(store)
+            else:
+                self._open.discard(store)
+            if store in self._offline:
+                self._rebuild()
+
+    def remove(self, store):
+        self.set_offline(store, None)
+        self.set_shift(store, False)
+
+    def view(self):
+        """Готовый список [{"store", "offline_since"}], не копируется."""
+        return self._view
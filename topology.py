@@ -0,0 +1,174 @@
+import json
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Необязательная карта сети: магазин -> узел VPN (концентратор, шлюз
+# старой VPN) -> вышестоящий узел. Узлы опрашиваются отдельно, сверху вниз;
+# пока узел недоступен, магазины за ним не пингуются, а сразу помечаются
+# «недоступен узел связи». Без файла опрос работает как раньше.
+#
+# topology.json:
+# {
+#   "hubs": {
+#     "core": {"ip": "10.0.0.1"},
+#     "vpn-new": {"ip": "14.12.0.1", "parent": "core"},
+#     "gw-old": {"ip": "192.168.0.1", "parent": "core"}
+#   },
+#   "vpn": {"Новая VPN": "vpn-new", "Старая VPN": "gw-old"},
+#   "stores": {"shop1z": "gw-old"}
+# }
+# "vpn" задаёт узел по типу VPN, "stores" — исключения для отдельных магазинов.
+TOPOLOGY_PATH = r"topology.json"
+
+HUB_INTERVAL = 5  # сек между опросами узлов
+HUB_FAIL_THRESHOLD = 2  # неудачных опросов подряд, чтобы считать узел недоступным
+HUB_WORKERS = 8
+
+_lock = threading.Lock()
+_hubs = {}  # имя -> {"ip", "parent", "up", "fails", "upstream"}
+_store_hub = {}
+_vpn_hub = {}
+_mtime = 0
+
+
+def load(path=TOPOLOGY_PATH):
+    """Перечитывает карту, если файл изменился; состояние узлов сохраняется."""
+    global _mtime
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = 0
+    if mtime == _mtime:
+        return
+    _mtime = mtime
+
+    config = {}
+    if mtime:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except Exception as e:
+            logging.error(f"Ошибка загрузки карты сети: {e}")
+            return
+
+    hubs = {}
+    for name, hub in config.get("hubs", {}).items():
+        old = _hubs.get(name, {})
+        hubs[name] = {
+            "ip": hub["ip"],
+            "parent": hub.get("parent"),
+            "up": old.get("up", True),
+            "fails": old.get("fails", 0),
+            "upstream": old.get("upstream", False),
+        }
+
+    with _lock:
+        _hubs.clear()
+        _hubs.update(hubs)
+        _store_hub.clear()
+        _store_hub.update(config.get("stores", {}))
+        _vpn_hub.clear()
+        _vpn_hub.update(config.get("vpn", {}))
+    if hubs:
+        logging.info(f"Карта сети загружена: {len(hubs)} узлов.")
+
+
+def hub_for(store, vpn):
+    return _store_hub.get(store) or _vpn_hub.get(vpn)
+
+
+def down_hub(name):
+    """Первый недоступный узел на пути от name вверх или None."""
+    seen = set()
+    while name is not None and name not in seen:
+        hub = _hubs.get(name)
+        if hub is None:
+            return None
+        if not hub["up"]:
+            return name
+        seen.add(name)
+        name = hub["parent"]
+    return None
+
+
+def levels():
+    """Узлы по уровням: сначала корневые, затем их потомки и так далее."""
+    remaining = dict(_hubs)
+    placed = set()
+    result = []
+    while remaining:
+        level = [
+            name
+            for name, hub in remaining.items()
+            if hub["parent"] in placed or hub["parent"] not in _hubs
+        ]
+        if not level:
+            level = list(remaining)  # цикл в карте: опрашиваем оставшиеся как есть
+        for name in level:
+            del remaining[name]
+        placed.update(level)
+        result.append(level)
+    return result
+
+
+def probe_hubs(ping, executor):
+    """Опрашивает узлы сверху вниз; потомков недоступного узла не пингует."""
+    for level in levels():
+        to_probe = []
+        for name in level:
+            hub = _hubs[name]
+            parent = hub["parent"]
+            if parent is not None and down_hub(parent) is not None:
+                set_state(name, up=False, upstream=True)
+            else:
+                to_probe.append(name)
+
+        results = executor.map(lambda name: ping(_hubs[name]["ip"]), to_probe)
+        for name, ok in zip(to_probe, results):
+            hub = _hubs[name]
+            if ok:
+                set_state(name, up=True, upstream=False)
+            else:
+                hub["fails"] += 1
+                if hub["fails"] >= HUB_FAIL_THRESHOLD:
+                    set_state(name, up=False, upstream=False)
+
+
+def set_state(name, up, upstream):
+    hub = _hubs[name]
+    if up:
+        hub["fails"] = 0
+    if hub["up"] != up:
+        if up:
+            logging.warning(f"Узел связи {name} ({hub['ip']}) снова доступен")
+        elif upstream:
+            logging.warning(f"Узел связи {name} за недоступным {hub['parent']}")
+        else:
+            logging.warning(f"Узел связи {name} ({hub['ip']}) недоступен")
+    hub["up"] = up
+    hub["upstream"] = upstream
+
+
+def run(ping, stop, interval=HUB_INTERVAL):
+    """Опрашивает узлы карты, пока не выставлен stop."""
+    with ThreadPoolExecutor(max_workers=HUB_WORKERS) as executor:
+        while True:
+            load()
+            if _hubs:
+                probe_hubs(ping, executor)
+            if stop.wait(interval):
+                return
+
+
+def snapshot():
+    return {
+        name: {
+            "ip": hub["ip"],
+            "parent": hub["parent"],
+            "up": hub["up"],
+            "upstream_down": hub["upstream"],
+        }
+        for name, hub in list(_hubs.items())
+    }